@@ -0,0 +1,194 @@
+"""Assign categorias to every term of the gooli-termos collection.
+
+Terms are streamed from MySQL in id order and processed in chunks: each
+chunk is embedded (reusing the pipeline's embedding cache), compared with
+the category centroids in a single matrix product and the resulting
+categorias are bulk-updated in Typesense. The id of the last processed
+term is checkpointed after every chunk, so an interrupted run resumes
+where it stopped. Terms Typesense rejects (e.g. committed but not imported
+yet) are kept in a retry list next to the checkpoint and processed first on
+the next run.
+
+    python add_categories.py [--categorias categorias.json] [--restart]
+"""
+
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+from openai import OpenAI
+from pypika import MySQLQuery as Query
+from scrapy.utils.project import data_path, get_project_settings
+
+from infolibras import search, utils
+from infolibras.db import connect, termo_tb
+from infolibras.embeddings import Embedder, EmbeddingCache
+
+logger = logging.getLogger("add_categories")
+
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return 0
+
+    with open(path) as f:
+        return int(f.read().strip() or 0)
+
+
+def write_checkpoint(path, termo_id):
+    with open(f"{path}.tmp", "w") as f:
+        f.write(str(termo_id))
+
+    os.replace(f"{path}.tmp", path)
+
+
+def read_retries(path):
+    if not os.path.exists(f"{path}.retry"):
+        return []
+
+    with open(f"{path}.retry") as f:
+        return [int(linha) for linha in f if linha.strip()]
+
+
+def write_retries(path, termo_ids):
+    with open(f"{path}.retry.tmp", "w") as f:
+        f.writelines(f"{termo_id}\n" for termo_id in termo_ids)
+
+    os.replace(f"{path}.retry.tmp", f"{path}.retry")
+
+
+def centroids(embedder, categorias):
+    nomes = list(categorias)
+    matriz = np.empty((len(nomes), embedder.cache.dimensoes), dtype=np.float32)
+
+    for linha, nome in enumerate(nomes):
+        vetores = np.stack(embedder.embed(categorias[nome]))
+        matriz[linha] = vetores.mean(axis=0)
+
+    matriz /= np.linalg.norm(matriz, axis=1, keepdims=True)
+
+    return nomes, matriz
+
+
+def categorize(embedder, documentos, nomes, matriz, threshold, max_categorias):
+    vetores = np.stack(
+        embedder.embed([search.embedding_text(documento) for documento in documentos])
+    )
+    vetores /= np.linalg.norm(vetores, axis=1, keepdims=True)
+    similaridades = vetores @ matriz.T
+    melhores = np.argsort(-similaridades, axis=1)[:, :max_categorias]
+
+    for documento, linha, indices in zip(documentos, similaridades, melhores):
+        yield {
+            "id": documento["id"],
+            "categorias": [nomes[i] for i in indices if linha[i] >= threshold],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--categorias", default="categorias.json")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--threshold", type=float, default=0.3)
+    parser.add_argument("--max-categorias", type=int, default=3)
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--restart", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    env = utils.env()
+    settings = get_project_settings()
+    checkpoint = args.checkpoint or os.path.join(
+        data_path("", createdir=True), "add_categories.checkpoint"
+    )
+
+    with open(args.categorias) as f:
+        categorias = json.load(f)
+
+    embedder = Embedder(
+        OpenAI(api_key=env["OPENAI_API_KEY"], base_url=env.get("OPENAI_BASE_URL")),
+        EmbeddingCache(
+            settings.get("INFOLIBRAS_EMBEDDING_CACHE_DIR")
+            or data_path("embeddings", createdir=True),
+            settings.getint("INFOLIBRAS_EMBEDDING_DIMENSIONS"),
+        ),
+        settings.get("INFOLIBRAS_EMBEDDING_MODEL"),
+        settings.getint("INFOLIBRAS_EMBEDDING_BATCH_SIZE"),
+    )
+    nomes, matriz = centroids(embedder, categorias)
+    collection = search.client(env).collections[search.COLLECTION]
+
+    ultimo_id = 0 if args.restart else read_checkpoint(checkpoint)
+    reintentar = [] if args.restart else read_retries(checkpoint)
+
+    # One connection streams the term ids with an unbuffered (server-side)
+    # cursor while the other assembles the documents of each chunk.
+    stream_conn, conn = connect(env), connect(env)
+    stream = stream_conn.cursor(buffered=False)
+    cur = conn.cursor()
+
+    stream.execute(
+        Query.from_(termo_tb)
+        .select(termo_tb.id)
+        .where(termo_tb.id > ultimo_id)
+        .orderby(termo_tb.id)
+        .get_sql()
+    )
+
+    def processar(termo_ids):
+        documentos = search.build_documentos(cur, termo_ids)
+        rejeitados = search.import_documentos(
+            collection,
+            list(
+                categorize(
+                    embedder,
+                    documentos,
+                    nomes,
+                    matriz,
+                    args.threshold,
+                    args.max_categorias,
+                )
+            ),
+            "update",
+        )
+        return [int(termo_id) for termo_id in rejeitados]
+
+    total = 0
+    rejeitados = []
+
+    try:
+        for inicio in range(0, len(reintentar), args.chunk_size):
+            fim = inicio + args.chunk_size
+            rejeitados += processar(reintentar[inicio:fim])
+            write_retries(checkpoint, reintentar[fim:] + rejeitados)
+
+        while True:
+            termo_ids = [termo_id for termo_id, in stream.fetchmany(args.chunk_size)]
+
+            if not termo_ids:
+                break
+
+            rejeitados += processar(termo_ids)
+            # Before the checkpoint moves past them.
+            write_retries(checkpoint, rejeitados)
+            write_checkpoint(checkpoint, termo_ids[-1])
+            total += len(termo_ids)
+            logger.info("Categorized %d terms (up to id %d)", total, termo_ids[-1])
+
+        if rejeitados:
+            logger.warning(
+                "%d terms were rejected and will be retried on the next run",
+                len(rejeitados),
+            )
+    finally:
+        stream.close()
+        cur.close()
+        stream_conn.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
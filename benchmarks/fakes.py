@@ -0,0 +1,279 @@
+"""Local stand-ins for the services the crawl talks to.
+
+* ``connect_sqlite`` is a drop-in for ``infolibras.db.connect`` backed by
+  SQLite, with MySQL-only syntax translated and every round trip counted.
+  Statements commit on their own: a SQLite transaction locks the whole
+  database, which would serialize the storage writers where MySQL's row
+  locks don't, so ``rollback`` undoes nothing here.
+* ``StubServer`` answers the Typesense and OpenAI embeddings endpoints the
+  pipeline uses, with an injectable latency.
+* ``ReplayDownloaderMiddleware`` serves recorded pages instead of fetching
+  them.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import numpy as np
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import HtmlResponse
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS termo (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    termo TEXT NOT NULL,
+    slug TEXT NOT NULL,
+    chave CHAR(32) NOT NULL UNIQUE,
+    pendente INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS variacao (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idTermo INTEGER NOT NULL,
+    variacao TEXT NOT NULL,
+    slug TEXT NOT NULL,
+    chave CHAR(32) NOT NULL,
+    UNIQUE (idTermo, chave)
+);
+CREATE TABLE IF NOT EXISTS definicao (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idTermo INTEGER NOT NULL,
+    definicao TEXT NOT NULL,
+    fonte TEXT NOT NULL,
+    hash CHAR(32) NOT NULL,
+    UNIQUE (idTermo, hash)
+);
+CREATE TABLE IF NOT EXISTS definicao_mesclada (
+    idTermo INTEGER NOT NULL,
+    hash CHAR(32) NOT NULL,
+    PRIMARY KEY (idTermo, hash)
+);
+CREATE INDEX IF NOT EXISTS variacao_idTermo ON variacao (idTermo);
+"""
+
+
+class RoundTrips:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def inc(self):
+        with self.lock:
+            self.count += 1
+
+
+round_trips = RoundTrips()
+
+# Seconds slept on every database round trip, set by the benchmark runner.
+db_latency = 0.0
+
+
+def _translate(sql):
+    return (
+        sql.replace("INSERT IGNORE", "INSERT OR IGNORE")
+        .replace(" LOCK IN SHARE MODE", "")
+        .replace("%s", "?")
+    )
+
+
+class SqliteCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursor = conn._conn.cursor()
+
+    def _round_trip(self):
+        round_trips.inc()
+
+        if db_latency:
+            time.sleep(db_latency)
+
+    def execute(self, sql, params=()):
+        self._round_trip()
+        self._conn.in_transaction = True
+        self._cursor.execute(_translate(sql), params)
+
+    def executemany(self, sql, rows):
+        self._round_trip()
+        self._conn.in_transaction = True
+        self._cursor.executemany(_translate(sql), rows)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class SqliteConnection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=60
+        )
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(SCHEMA)
+        # The MySQL functions of storage.shard_criterion.
+        self._conn.create_function("CONV", 3, lambda n, de, para: int(n, de))
+        self._conn.create_function("MOD", 2, lambda a, b: a % b)
+        # Like MySQL with autocommit off, any statement starts a transaction.
+        self.in_transaction = False
+
+    def cursor(self, buffered=None):
+        return SqliteCursor(self)
+
+    def commit(self):
+        round_trips.inc()
+        self.in_transaction = False
+
+    def rollback(self):
+        self.in_transaction = False
+
+    def close(self):
+        self._conn.close()
+
+
+def connect_sqlite(env=None):
+    return SqliteConnection(env["DB_NAME"])
+
+
+class StubServer(ThreadingHTTPServer):
+    """Typesense and OpenAI embeddings stub on a local port."""
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, dimensoes=3072):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency = latency
+        self.dimensoes = dimensoes
+        self.requests = {}
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def count(self, nome):
+        with self.lock:
+            self.requests[nome] = self.requests.get(nome, 0) + 1
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _reply(self, body, content_type="application/json"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.count("typesense")
+        time.sleep(self.server.latency)
+
+        path = urlparse(self.path).path
+
+        if path == "/collections":
+            self._reply([{"name": "gooli-termos"}, {"name": "gooli-termos-queries"}])
+        elif path.startswith("/collections/"):
+            self._reply({"name": path.split("/")[2]})
+        else:
+            self._reply({"message": "Not Found"})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._body()
+        time.sleep(self.server.latency)
+
+        if path.endswith("/embeddings"):
+            self.server.count("embeddings")
+            textos = json.loads(body)["input"]
+            self._reply(
+                {
+                    "object": "list",
+                    "model": "stub",
+                    "data": [
+                        {
+                            "object": "embedding",
+                            "index": i,
+                            "embedding": self._embedding(texto),
+                        }
+                        for i, texto in enumerate(textos)
+                    ],
+                    "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                }
+            )
+        elif path.endswith("/documents/import"):
+            self.server.count("typesense")
+            linhas = body.decode().count("\n") + 1
+            self._reply("\n".join(['{"success":true}'] * linhas), "text/plain")
+        else:
+            self.server.count("typesense")
+            self._reply({})
+
+    def _embedding(self, texto):
+        seed = int.from_bytes(hashlib.blake2b(texto.encode(), digest_size=4).digest())
+        vetor = np.random.default_rng(seed).standard_normal(self.server.dimensoes)
+        return (vetor / np.linalg.norm(vetor)).round(6).tolist()
+
+
+class ReplayDownloaderMiddleware:
+    """Answers every request from a fixtures directory instead of the network.
+
+    The directory holds an ``index.json`` mapping each URL to the file with
+    its body.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(os.path.join(path, "index.json")) as f:
+            self.index = json.load(f)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings["BENCHMARK_FIXTURES"])
+
+    def process_request(self, request, spider):
+        arquivo = self.index.get(request.url)
+
+        if arquivo is None:
+            raise IgnoreRequest(f"No fixture for {request.url}")
+
+        with open(os.path.join(self.path, arquivo), "rb") as f:
+            return HtmlResponse(
+                request.url, body=f.read(), encoding="utf-8", request=request
+            )
@@ -0,0 +1,108 @@
+"""Synthetic page fixtures shaped like the three glossary sites.
+
+Recorded pages can be used instead: any directory with an ``index.json``
+mapping URLs to body files works with ``--fixtures``.
+"""
+
+import json
+import os
+import random
+
+from infolibras.spiders.ditech import DitechSpider
+from infolibras.spiders.douglasgaspar import DouglasgasparSpider
+from infolibras.spiders.juliobattisti import JuliobattistiSpider
+
+PALAVRAS = (
+    "dados sistema rede arquivo memória processador programa protocolo usuário "
+    "servidor cliente disco código linguagem computador internet endereço "
+    "conexão dispositivo aplicativo informação banco registro segurança acesso"
+).split()
+
+
+def _frase(rng, tamanho):
+    return " ".join(rng.choice(PALAVRAS) for _ in range(tamanho)).capitalize()
+
+
+def _termos(rng, quantidade):
+    for n in range(quantidade):
+        termo = f"{_frase(rng, 2)} {n}"
+        variacao = f"{rng.choice(PALAVRAS).upper()}{n}" if n % 3 == 0 else None
+        yield termo, variacao, _frase(rng, rng.randint(8, 40)) + "."
+
+
+def ditech(rng, quantidade):
+    paginas = {}
+    links = []
+
+    for n, (termo, variacao, definicao) in enumerate(_termos(rng, quantidade)):
+        url = f"https://www.dictech.com.br/termo-{n}/"
+        titulo = f"{termo} ({variacao})" if variacao else termo
+        links.append(f'<li><a href="{url}">{titulo}</a></li>')
+        paginas[url] = (
+            f'<html><body><h1 class="header-post-title-class">{titulo}</h1>'
+            f'<div class="entry-content"><p>{titulo}: {definicao}</p></div>'
+            "</body></html>"
+        )
+
+    paginas[DitechSpider.start_urls[0]] = (
+        f'<html><body><div id="content"><ul>{"".join(links)}</ul></div>'
+        "</body></html>"
+    )
+
+    return paginas
+
+
+def juliobattisti(rng, quantidade):
+    paragrafos = ["<p><strong>Dicionário</strong></p>", "<p><strong>A</strong></p>"]
+
+    for termo, variacao, definicao in _termos(rng, quantidade):
+        titulo = f"{termo} ({variacao})" if variacao else termo
+        paragrafos.append(f"<p><strong>{titulo}: </strong> <br/>\n{definicao}</p>")
+
+    return {
+        JuliobattistiSpider.start_urls[0]: (
+            '<html><body><div id="conteudo_cont">'
+            f'{"".join(paragrafos)}</div></body></html>'
+        )
+    }
+
+
+def douglasgaspar(rng, quantidade):
+    itens = []
+
+    for termo, variacao, definicao in _termos(rng, quantidade):
+        if variacao:
+            itens.append(f"<li>{termo}: <em>{variacao}</em> –  {definicao}</li>")
+        else:
+            itens.append(f"<li>{termo} – {definicao}</li>")
+
+    return {
+        DouglasgasparSpider.start_urls[0]: (
+            f'<html><body><div class="content"><ul>{"".join(itens)}</ul></div>'
+            "</body></html>"
+        )
+    }
+
+
+GERADORES = {
+    "ditech": ditech,
+    "juliobattisti": juliobattisti,
+    "douglasgaspar": douglasgaspar,
+}
+
+
+def generate(path, spiders, quantidade, seed=0):
+    os.makedirs(path, exist_ok=True)
+    rng = random.Random(seed)
+    index = {}
+
+    for spider in spiders:
+        for url, corpo in GERADORES[spider](rng, quantidade).items():
+            arquivo = f"{spider}-{len(index)}.html"
+            index[url] = arquivo
+
+            with open(os.path.join(path, arquivo), "w", encoding="utf-8") as f:
+                f.write(corpo)
+
+    with open(os.path.join(path, "index.json"), "w") as f:
+        json.dump(index, f)
@@ -0,0 +1,29 @@
+import time
+
+from infolibras.pipelines import InfolibrasPipeline
+
+
+class BenchmarkPipeline(InfolibrasPipeline):
+    """Records, for every item, the time from process_item until its batch
+    is committed."""
+
+    latencias = []
+
+    def process_item(self, item, spider):
+        self.inicio = getattr(self, "inicio", {})
+        self.inicio[id(item)] = time.perf_counter()
+        return super().process_item(item, spider)
+
+    def flush(self):
+        items = self.buffer
+        d = super().flush()
+        d.addCallback(self._committed, items)
+        return d
+
+    def _committed(self, resultado, items):
+        fim = time.perf_counter()
+
+        for item in items:
+            self.latencias.append(fim - self.inicio.pop(id(item)))
+
+        return resultado
@@ -0,0 +1,141 @@
+"""Offline throughput benchmark for the spiders and InfolibrasPipeline.
+
+Replays page fixtures through the real spiders and pipeline, with MySQL,
+Typesense and the OpenAI embeddings endpoint replaced by the local
+stand-ins in ``benchmarks.fakes``, and reports items/sec, per-item
+pipeline latency, database round trips per item and peak RSS.
+
+    python -m benchmarks.run [--spiders ditech,juliobattisti] [--terms 2000]
+        [--db-latency-ms 1] [--typesense-latency-ms 5] [--writers 4]
+"""
+
+import argparse
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+
+import numpy as np
+from scrapy import signals
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from benchmarks import fakes, fixtures
+from benchmarks.pipelines import BenchmarkPipeline
+
+SPIDERS = ["ditech", "juliobattisti", "douglasgaspar"]
+
+
+def run(args):
+    diretorio = tempfile.mkdtemp(prefix="infolibras-bench-")
+    spiders = args.spiders.split(",")
+
+    if args.fixtures is None:
+        args.fixtures = os.path.join(diretorio, "fixtures")
+        fixtures.generate(args.fixtures, spiders, args.terms)
+
+    servidor = fakes.StubServer(
+        latency=args.typesense_latency_ms / 1000, dimensoes=args.embedding_dimensions
+    ).start()
+    fakes.db_latency = args.db_latency_ms / 1000
+
+    os.environ.update(
+        {
+            "DB_HOST": "localhost",
+            "DB_PORT": "0",
+            "DB_USER": "",
+            "DB_PASSWORD": "",
+            "DB_NAME": os.path.join(diretorio, "infolibras.sqlite3"),
+            "TYPESENSE_HOST": "127.0.0.1",
+            "TYPESENSE_PORT": str(servidor.port),
+            "TYPESENSE_PROTOCOL": "http",
+            "TYPESENSE_API_KEY": "benchmark",
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{servidor.port}/v1",
+        }
+    )
+
+    settings = get_project_settings()
+    settings.setdict(
+        {
+            "BENCHMARK_FIXTURES": args.fixtures,
+            "DOWNLOADER_MIDDLEWARES": {
+                "benchmarks.fakes.ReplayDownloaderMiddleware": 1000,
+            },
+            "ITEM_PIPELINES": {"benchmarks.pipelines.BenchmarkPipeline": 300},
+            "INFOLIBRAS_DB_CONNECT": "benchmarks.fakes.connect_sqlite",
+            "INFOLIBRAS_EMBEDDING_CACHE_DIR": os.path.join(diretorio, "embeddings"),
+            "FRONTIER_DIR": os.path.join(diretorio, "frontier"),
+            "INFOLIBRAS_EMBEDDING_DIMENSIONS": args.embedding_dimensions,
+            "INFOLIBRAS_WRITERS": args.writers,
+            "ROBOTSTXT_OBEY": False,
+            "TELNETCONSOLE_ENABLED": False,
+            "LOG_LEVEL": args.log_level,
+        },
+        priority="cmdline",
+    )
+
+    process = CrawlerProcess(settings)
+    itens = {"count": 0}
+    lock = threading.Lock()
+
+    def item_scraped(item, spider):
+        with lock:
+            itens["count"] += 1
+
+    for spider in spiders:
+        crawler = process.create_crawler(spider)
+        crawler.signals.connect(item_scraped, signal=signals.item_scraped)
+        process.crawl(crawler)
+
+    inicio = time.perf_counter()
+    process.start()
+    duracao = time.perf_counter() - inicio
+
+    latencias = np.array(BenchmarkPipeline.latencias) * 1000
+    total = max(itens["count"], 1)
+
+    return {
+        "spiders": spiders,
+        "items": itens["count"],
+        "seconds": round(duracao, 3),
+        "items_per_sec": round(itens["count"] / duracao, 1),
+        "pipeline_latency_ms": {
+            "p50": (
+                round(float(np.percentile(latencias, 50)), 2)
+                if len(latencias)
+                else None
+            ),
+            "p99": (
+                round(float(np.percentile(latencias, 99)), 2)
+                if len(latencias)
+                else None
+            ),
+        },
+        "db_round_trips_per_item": round(fakes.round_trips.count / total, 3),
+        "http_requests": dict(servidor.requests),
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spiders", default=",".join(SPIDERS))
+    parser.add_argument("--terms", type=int, default=2000)
+    parser.add_argument("--fixtures", default=None)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--typesense-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embedding-dimensions", type=int, default=3072)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
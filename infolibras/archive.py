@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import time
+import zlib
+from typing import Optional
+
+import msgspec
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from scrapy.utils.request import request_from_dict
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS corpo (
+    hash TEXT PRIMARY KEY,
+    segmento TEXT NOT NULL,
+    inicio INTEGER NOT NULL,
+    tamanho INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resposta (
+    id INTEGER PRIMARY KEY,
+    spider TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers BLOB NOT NULL,
+    requisicao BLOB,
+    hash TEXT NOT NULL REFERENCES corpo (hash),
+    data REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS resposta_url ON resposta (spider, url);
+"""
+
+
+def archive_dir(settings) -> str:
+    diretorio = settings.get("ARCHIVE_DIR") or data_path("archive")
+    os.makedirs(diretorio, exist_ok=True)
+    return diretorio
+
+
+class ResponseArchive:
+    """Append-only archive of crawled responses in ``diretorio``.
+
+    Bodies are zlib-compressed and appended to segment files of up to
+    ``tamanho_segmento`` bytes, each distinct body once: a page fetched again
+    unchanged only adds a row to the index. The index (``index.sqlite3``)
+    maps every response to its URL, status, headers, serialized request and
+    body, and every body hash to its segment and offset. Each process writes
+    its own segments, so several crawls can archive at once.
+    """
+
+    def __init__(
+        self, diretorio: str, prefixo: str = "", tamanho_segmento: int = 256 << 20
+    ) -> None:
+        self.diretorio = diretorio
+        self.prefixo = f"{prefixo}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self.tamanho_segmento = tamanho_segmento
+        self.conn = sqlite3.connect(
+            os.path.join(diretorio, "index.sqlite3"), timeout=60
+        )
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.sequencia = 0
+        self.segmento = None
+        self.arquivo = None
+        self.leitura = {}
+
+    def add(self, spider: str, response, requisicao: Optional[bytes]) -> bool:
+        """Archive a response, returning whether its body was new."""
+        hash = hashlib.blake2b(response.body, digest_size=16).hexdigest()
+        novo = (
+            self.conn.execute("SELECT 1 FROM corpo WHERE hash = ?", (hash,)).fetchone()
+            is None
+        )
+
+        if novo:
+            self._append(hash, zlib.compress(response.body))
+
+        self.conn.execute(
+            "INSERT INTO resposta (spider, url, status, headers, requisicao, hash,"
+            " data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                spider,
+                response.url,
+                response.status,
+                msgspec.msgpack.encode(list(response.headers.items())),
+                requisicao,
+                hash,
+                time.time(),
+            ),
+        )
+        self.conn.commit()
+        return novo
+
+    def _append(self, hash: str, dados: bytes) -> None:
+        if self.arquivo is None or self.arquivo.tell() >= self.tamanho_segmento:
+            self._rotate()
+
+        inicio = self.arquivo.tell()
+        self.arquivo.write(dados)
+        # The index must never point past what is on disk.
+        self.arquivo.flush()
+        self.conn.execute(
+            "INSERT OR IGNORE INTO corpo (hash, segmento, inicio, tamanho)"
+            " VALUES (?, ?, ?, ?)",
+            (hash, self.segmento, inicio, len(dados)),
+        )
+
+    def _rotate(self) -> None:
+        if self.arquivo is not None:
+            self.arquivo.close()
+
+        self.sequencia += 1
+        self.segmento = f"{self.prefixo}-{self.sequencia:05d}.seg"
+        self.arquivo = open(os.path.join(self.diretorio, self.segmento), "ab")
+
+    def latest(self, spider: str, extras: tuple[int, ...] = ()) -> list[int]:
+        """Ids of the last successful archived response of each of the
+        spider's URLs: a 2xx status, or one of ``extras``."""
+        marcadores = ", ".join("?" * len(extras))
+
+        return [
+            linha[0]
+            for linha in self.conn.execute(
+                "SELECT max(id) FROM resposta WHERE spider = ? AND (status BETWEEN"
+                f" 200 AND 299 OR status IN ({marcadores})) GROUP BY url ORDER BY 1",
+                (spider, *extras),
+            )
+        ]
+
+    def get(self, id: int, spider=None):
+        """Rebuild an archived response, with its request (and so its
+        callback, meta and cb_kwargs) when ``spider`` is given."""
+        url, status, headers, requisicao, segmento, inicio, tamanho = self.conn.execute(
+            "SELECT url, status, headers, requisicao, segmento, inicio, tamanho"
+            " FROM resposta JOIN corpo USING (hash) WHERE id = ?",
+            (id,),
+        ).fetchone()
+
+        if segmento not in self.leitura:
+            self.leitura[segmento] = open(os.path.join(self.diretorio, segmento), "rb")
+
+        arquivo = self.leitura[segmento]
+        arquivo.seek(inicio)
+        body = zlib.decompress(arquivo.read(tamanho))
+        headers = Headers(dict(msgspec.msgpack.decode(headers)))
+        request = None
+
+        if spider is not None and requisicao is not None:
+            request = request_from_dict(pickle.loads(requisicao), spider=spider)
+
+        cls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return cls(url=url, status=status, headers=headers, body=body, request=request)
+
+    def close(self) -> None:
+        if self.arquivo is not None:
+            self.arquivo.close()
+            self.arquivo = None
+
+        for arquivo in self.leitura.values():
+            arquivo.close()
+
+        self.leitura.clear()
+        self.conn.close()
+
+
+class ArchiveDownloaderMiddleware:
+    # Archives every response that reaches the spider (see ResponseArchive),
+    # so `scrapy reparse` can re-run the spider's callbacks over them without
+    # fetching anything.
+
+    def __init__(self, diretorio, tamanho_segmento, stats):
+        self.diretorio = diretorio
+        self.tamanho_segmento = tamanho_segmento
+        self.stats = stats
+        self.archive = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("ARCHIVE_ENABLED"):
+            raise NotConfigured
+
+        s = cls(
+            archive_dir(crawler.settings),
+            crawler.settings.getint("ARCHIVE_SEGMENT_SIZE"),
+            crawler.stats,
+        )
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_opened(self, spider):
+        self.archive = ResponseArchive(
+            self.diretorio, spider.name, self.tamanho_segmento
+        )
+
+    def process_response(self, request, response, spider):
+        if response.status == 304:
+            return response
+
+        try:
+            requisicao = pickle.dumps(request.to_dict(spider=spider), protocol=4)
+        except (ValueError, pickle.PicklingError, TypeError):
+            # A callback that isn't a spider method, or unpicklable meta: the
+            # response is replayed through spider.parse.
+            requisicao = None
+
+        if self.archive.add(spider.name, response, requisicao):
+            self.stats.inc_value("archive/bodies", spider=spider)
+        else:
+            self.stats.inc_value("archive/duplicate_bodies", spider=spider)
+
+        return response
+
+    def spider_closed(self, spider):
+        self.archive.close()
@@ -0,0 +1,20 @@
+from scrapy.commands import ScrapyCommand
+
+from infolibras import search, utils
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    requires_crawler_process = False
+
+    def short_desc(self):
+        return "Create the Typesense collections and analytics rules"
+
+    def run(self, args, opts):
+        env = utils.env()
+        criadas = search.bootstrap(search.client(env), env)
+
+        if criadas:
+            print(f"Created {', '.join(criadas)}")
+        else:
+            print("Collections already exist")
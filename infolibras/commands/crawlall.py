@@ -0,0 +1,34 @@
+from scrapy.commands import BaseRunSpiderCommand
+from scrapy.exceptions import UsageError
+
+
+class Command(BaseRunSpiderCommand):
+    requires_project = True
+
+    def syntax(self):
+        return "[options] [spider ...]"
+
+    def short_desc(self):
+        return "Run several spiders (all by default) together in one process"
+
+    def long_desc(self):
+        return (
+            "Run the given spiders, or every spider of the project, concurrently "
+            "in one process. They share the MySQL connection pool and the "
+            "Typesense batching writer of the pipeline."
+        )
+
+    def run(self, args, opts):
+        spiders = self.crawler_process.spider_loader.list()
+        desconhecidos = set(args) - set(spiders)
+
+        if desconhecidos:
+            raise UsageError(f"Unknown spiders: {', '.join(sorted(desconhecidos))}")
+
+        for nome in args or spiders:
+            self.crawler_process.crawl(nome, **opts.spargs)
+
+        self.crawler_process.start()
+
+        if self.crawler_process.bootstrap_failed:
+            self.exitcode = 1
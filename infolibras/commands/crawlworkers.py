@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+from scrapy.utils.project import data_path
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    requires_crawler_process = False
+
+    def syntax(self):
+        return "[options] <spider>"
+
+    def short_desc(self):
+        return "Run a spider in several worker processes sharing one frontier"
+
+    def long_desc(self):
+        return (
+            "Start --workers `scrapy crawl` processes for the spider, all pulling "
+            "requests from the SQLite frontier in --frontier (see "
+            "infolibras.frontier.SharedFrontierScheduler), so parsing uses every "
+            "core and no URL is fetched twice. -s settings are passed to every "
+            "worker. Workers can also be started by hand, with the same settings, "
+            "on other machines sharing the frontier."
+        )
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="number of worker processes (default: number of CPUs)",
+        )
+        parser.add_argument(
+            "--frontier",
+            help="frontier database (default: .scrapy/frontier.sqlite3)",
+        )
+
+    def run(self, args, opts):
+        if len(args) != 1:
+            raise UsageError
+
+        frontier = opts.frontier or data_path("frontier.sqlite3")
+        comando = [
+            sys.executable,
+            "-m",
+            "scrapy",
+            "crawl",
+            args[0],
+            "-s",
+            "SCHEDULER=infolibras.frontier.SharedFrontierScheduler",
+            "-s",
+            f"FRONTIER_DB={os.path.abspath(frontier)}",
+        ]
+
+        for setting in opts.set:
+            comando += ["-s", setting]
+
+        workers = [subprocess.Popen(comando) for _ in range(opts.workers)]
+
+        self.exitcode = max(worker.wait() for worker in workers)
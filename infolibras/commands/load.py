@@ -0,0 +1,97 @@
+import logging
+
+import msgspec
+from scrapy.commands import ScrapyCommand
+from scrapy.utils.project import data_path
+
+from infolibras import spool
+from infolibras.metrics import Metrics
+from infolibras.storage import Storage
+from infolibras.utils import definicao_hash, normalize
+
+logger = logging.getLogger(__name__)
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    requires_crawler_process = False
+
+    def syntax(self):
+        return "[options] [segment ...]"
+
+    def short_desc(self):
+        return "Write spooled items to MySQL and Typesense"
+
+    def long_desc(self):
+        return (
+            "Stream the complete segments of INFOLIBRAS_SPOOL_DIR (or the given "
+            "segment files), drop repeated definitions and write them to MySQL "
+            "and Typesense in batches of --batch-size items. Loaded segments are "
+            "moved to the done/ subdirectory; a failed load can be replayed."
+        )
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="items written per MySQL transaction (default: 1000)",
+        )
+
+    def run(self, args, opts):
+        diretorio = self.settings.get("INFOLIBRAS_SPOOL_DIR") or data_path(
+            "spool", createdir=True
+        )
+        segmentos = args or spool.segments(diretorio)
+
+        if not segmentos:
+            print(f"No segments to load in {diretorio}")
+            return
+
+        storage = Storage.from_settings(
+            self.settings, Metrics(self.settings.getfloat("METRICS_SAMPLE_RATE", 1.0))
+        )
+        storage.connect()
+
+        total = 0
+
+        try:
+            for segmento in segmentos:
+                # Per segment, so memory stays bounded however many segments
+                # are loaded; storage skips what earlier segments wrote.
+                vistos = set()
+                items = []
+
+                for item in spool.read_segment(segmento):
+                    # Repeats carrying other variations are kept for them.
+                    chave = (
+                        normalize(item.termo),
+                        definicao_hash(item.definicao),
+                        tuple(
+                            msgspec.structs.astuple(variacao)
+                            for variacao in item.variacoes
+                        ),
+                    )
+
+                    if chave in vistos:
+                        continue
+
+                    vistos.add(chave)
+                    items.append(item)
+
+                    if len(items) >= opts.batch_size:
+                        storage.write(items)
+                        total += len(items)
+                        items = []
+
+                if items:
+                    storage.write(items)
+                    total += len(items)
+
+                spool.mark_done(segmento)
+                logger.info("Loaded %s", segmento)
+        finally:
+            storage.disconnect()
+
+        print(f"Loaded {total} items from {len(segmentos)} segments")
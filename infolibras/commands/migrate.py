@@ -0,0 +1,20 @@
+from scrapy.commands import ScrapyCommand
+
+from infolibras.db import connect
+from infolibras.migrations import migrate
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    requires_crawler_process = False
+
+    def short_desc(self):
+        return "Apply the database migrations"
+
+    def run(self, args, opts):
+        conn = connect()
+
+        try:
+            migrate(conn)
+        finally:
+            conn.close()
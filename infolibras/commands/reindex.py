@@ -0,0 +1,170 @@
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from pypika import MySQLQuery as Query
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+from scrapy.utils.misc import load_object
+
+from infolibras import search, utils
+from infolibras.db import termo_tb
+from infolibras.metrics import Metrics
+from infolibras.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    requires_crawler_process = False
+
+    def short_desc(self):
+        return "Rebuild gooli-termos from MySQL and swap its alias"
+
+    def long_desc(self):
+        return (
+            "Stream every term from MySQL, build its document in chunks of "
+            "--chunk-size terms and bulk-import them into a new versioned "
+            "collection with --workers parallel imports. The gooli-termos alias "
+            "is then swapped to it and the previous collection dropped, so search "
+            "stays online throughout. Categorias and contem_video are not stored "
+            "in MySQL, so they are copied over from the previous collection."
+        )
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="terms per import request (default: 500)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="parallel import requests (default: 4)",
+        )
+        parser.add_argument(
+            "--keep-old",
+            action="store_true",
+            help="keep the collection the alias pointed to",
+        )
+        parser.add_argument(
+            "--replace-collection",
+            action="store_true",
+            help="replace a gooli-termos collection made before aliases were used; "
+            "search is unavailable for the moment between dropping it and "
+            "creating the alias",
+        )
+
+    def run(self, args, opts):
+        env = utils.env()
+        client = search.client(env)
+        antiga = search.alias_target(client, search.COLLECTION)
+        legado = antiga is None and search.collection_exists(client, search.COLLECTION)
+
+        if legado and not opts.replace_collection:
+            raise UsageError(
+                f"{search.COLLECTION} is a collection, not an alias; rerun with "
+                "--replace-collection to replace it"
+            )
+
+        nome = search.versioned_name()
+        client.collections.create(search.termos_schema(env, nome))
+        logger.info("Reindexing into %s", nome)
+
+        total, falhas = self._import(
+            env, nome, antiga or (search.COLLECTION if legado else None), opts
+        )
+
+        if falhas:
+            logger.error(
+                "%d of %d documents failed, %s left in place and %s kept for "
+                "inspection",
+                falhas,
+                total,
+                search.COLLECTION,
+                nome,
+            )
+            self.exitcode = 1
+            return
+
+        if legado:
+            client.collections[search.COLLECTION].delete()
+
+        search.swap_alias(client, search.COLLECTION, nome)
+
+        if antiga is not None and not opts.keep_old:
+            client.collections[antiga].delete()
+
+        print(f"Indexed {total} terms into {nome}, {search.COLLECTION} -> {nome}")
+
+    def _import(self, env, nome, origem, opts):
+        db_connect = load_object(
+            self.settings.get("INFOLIBRAS_DB_CONNECT", "infolibras.db.connect")
+        )
+        embedder = Storage.from_settings(
+            self.settings, Metrics(self.settings.getfloat("METRICS_SAMPLE_RATE", 1.0))
+        ).embedder(env)
+        clientes = threading.local()
+
+        def importar(documentos):
+            # typesense.Client keeps a requests session, one per worker.
+            if not hasattr(clientes, "client"):
+                clientes.client = search.client(env)
+
+            if origem is not None:
+                antigos = search.export_fields(
+                    clientes.client.collections[origem],
+                    [documento["id"] for documento in documentos],
+                )
+
+                for documento in documentos:
+                    documento.update(antigos.get(documento["id"], {}))
+
+            return len(
+                search.import_documentos(
+                    clientes.client.collections[nome], documentos, "create"
+                )
+            )
+
+        # The term ids are streamed through an unbuffered cursor on their own
+        # connection; each chunk's documents are built on another one.
+        stream_conn = db_connect(env)
+        conn = db_connect(env)
+        total = falhas = 0
+
+        try:
+            stream = stream_conn.cursor()
+            stream.execute(
+                Query.from_(termo_tb).select(termo_tb.id).orderby(termo_tb.id).get_sql()
+            )
+            cur = conn.cursor(buffered=True)
+
+            with ThreadPoolExecutor(opts.workers) as executor:
+                pendentes = set()
+
+                while ids := [linha[0] for linha in stream.fetchmany(opts.chunk_size)]:
+                    documentos = search.build_documentos(cur, ids)
+
+                    if embedder is not None:
+                        search.add_embeddings(embedder, documentos)
+
+                    if len(pendentes) >= opts.workers * 2:
+                        feitos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                        falhas += sum(futuro.result() for futuro in feitos)
+
+                    pendentes.add(executor.submit(importar, documentos))
+                    total += len(documentos)
+
+                falhas += sum(futuro.result() for futuro in pendentes)
+
+            stream.close()
+            cur.close()
+        finally:
+            stream_conn.close()
+            conn.close()
+
+        return total, falhas
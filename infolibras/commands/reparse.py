@@ -0,0 +1,150 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from scrapy import Request
+from scrapy.commands import ScrapyCommand
+from scrapy.crawler import Crawler
+from scrapy.exceptions import UsageError
+from scrapy.spiderloader import get_spider_loader
+from scrapy.utils.project import data_path
+
+from infolibras.archive import ResponseArchive, archive_dir
+from infolibras.spool import SpoolWriter
+
+logger = logging.getLogger(__name__)
+
+# State of each worker process, set up by _init_worker.
+_worker = {}
+
+
+def _init_worker(settings, spider_name, diretorio, spool_dir):
+    spidercls = get_spider_loader(settings).load(spider_name)
+    crawler = Crawler(spidercls, settings)
+
+    _worker["spider"] = spidercls.from_crawler(crawler)
+    _worker["archive"] = ResponseArchive(diretorio)
+    _worker["writer"] = SpoolWriter(
+        spool_dir,
+        f"{spider_name}-reparse",
+        settings.get("INFOLIBRAS_SPOOL_FORMAT", "msgpack"),
+        settings.getint("INFOLIBRAS_SPOOL_SEGMENT_ITEMS", 10_000),
+    )
+
+
+def _reparse(ids):
+    spider = _worker["spider"]
+    archive = _worker["archive"]
+    writer = _worker["writer"]
+    items = falhas = 0
+
+    for id in ids:
+        response = archive.get(id, spider)
+        request = response.request or Request(response.url)
+        callback = request.callback or spider.parse
+
+        try:
+            for saida in callback(response, **request.cb_kwargs) or ():
+                # Every archived page is reparsed on its own: the requests a
+                # callback yields are already in the archive (or never were).
+                if not isinstance(saida, Request):
+                    writer.write(saida)
+                    items += 1
+        except Exception:
+            logger.exception("Error reparsing %s", response.url)
+            falhas += 1
+
+    # Each chunk's items end up in complete segments.
+    writer.rotate()
+    return items, falhas
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    requires_crawler_process = False
+
+    def syntax(self):
+        return "[options] <spider>"
+
+    def short_desc(self):
+        return "Run a spider's callbacks over its archived responses"
+
+    def long_desc(self):
+        return (
+            "Re-run the spider's callbacks over the last successful archived "
+            "response of each of its URLs (see ARCHIVE_ENABLED), without any "
+            "network access, in --workers processes. Items are written to spool "
+            "segments in INFOLIBRAS_SPOOL_DIR; write them to storage with "
+            "`scrapy load`."
+        )
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="number of worker processes (default: number of CPUs)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=200,
+            help="responses per worker task (default: 200)",
+        )
+
+    def run(self, args, opts):
+        if len(args) != 1:
+            raise UsageError
+
+        nome = args[0]
+
+        try:
+            spidercls = get_spider_loader(self.settings).load(nome)
+        except KeyError:
+            raise UsageError(f"Spider not found: {nome}")
+
+        diretorio = archive_dir(self.settings)
+        archive = ResponseArchive(diretorio)
+        # The error responses the spider would have been given, as
+        # HttpErrorMiddleware lets them through.
+        extras = (
+            *getattr(spidercls, "handle_httpstatus_list", ()),
+            *self.settings.getlist("HTTPERROR_ALLOWED_CODES"),
+        )
+
+        try:
+            ids = archive.latest(nome, tuple(int(status) for status in extras))
+        finally:
+            archive.close()
+
+        if not ids:
+            print(f"No archived responses of {nome} in {diretorio}")
+            return
+
+        spool_dir = self.settings.get("INFOLIBRAS_SPOOL_DIR") or data_path(
+            "spool", createdir=True
+        )
+        chunks = [
+            ids[inicio : inicio + opts.chunk_size]
+            for inicio in range(0, len(ids), opts.chunk_size)
+        ]
+        items = falhas = 0
+
+        with ProcessPoolExecutor(
+            opts.workers,
+            initializer=_init_worker,
+            initargs=(self.settings.copy(), nome, diretorio, spool_dir),
+        ) as executor:
+            for chunk_items, chunk_falhas in executor.map(_reparse, chunks):
+                items += chunk_items
+                falhas += chunk_falhas
+
+        print(
+            f"Reparsed {len(ids)} responses of {nome} into {items} items in "
+            f"{spool_dir} ({falhas} failed)"
+        )
+
+        if falhas:
+            self.exitcode = 1
@@ -0,0 +1,83 @@
+from typing import Optional
+
+from pypika import MySQLQuery as Query
+from pypika import Table
+
+from infolibras import utils
+
+
+class TypedTable(Table):
+    __table__ = ""
+
+    def __init__(
+        self,
+        name: Optional[str] = None,
+        schema: Optional[str] = None,
+        alias: Optional[str] = None,
+        query_cls: Optional[Query] = None,
+    ) -> None:
+        if name is None:
+            if self.__table__:
+                name = self.__table__
+            else:
+                name = self.__class__.__name__
+
+        super().__init__(name, schema, alias, query_cls)
+
+
+class Termo(TypedTable):
+    __table__ = "termo"
+
+    id: int
+    termo: str
+    slug: str
+    chave: str
+    pendente: int
+
+
+class Variacao(TypedTable):
+    __table__ = "variacao"
+
+    id: int
+    idTermo: int
+    variacao: str
+    slug: str
+    chave: str
+
+
+class Definicao(TypedTable):
+    __table__ = "definicao"
+
+    id: int
+    idTermo: int
+    definicao: str
+    fonte: str
+    hash: str
+
+
+class DefinicaoMesclada(TypedTable):
+    __table__ = "definicao_mesclada"
+
+    idTermo: int
+    hash: str
+
+
+termo_tb = Termo()
+variacao_tb = Variacao()
+definicao_tb = Definicao()
+definicao_mesclada_tb = DefinicaoMesclada()
+
+
+def connect(env=None):
+    import mysql.connector
+
+    if env is None:
+        env = utils.env()
+
+    return mysql.connector.connect(
+        host=env["DB_HOST"],
+        port=int(env["DB_PORT"]),
+        user=env["DB_USER"],
+        password=env["DB_PASSWORD"],
+        database=env["DB_NAME"],
+    )
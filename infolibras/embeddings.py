@@ -0,0 +1,165 @@
+import contextlib
+import fcntl
+import hashlib
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+KEY_SIZE = 16
+
+
+def embedding_key(model: str, texto: str) -> bytes:
+    return hashlib.blake2b(f"{model}\0{texto}".encode(), digest_size=KEY_SIZE).digest()
+
+
+class EmbeddingCache:
+    """Append-only, memory-mapped float32 store of embeddings.
+
+    ``vectors.f32`` holds one row of ``dimensoes`` floats per embedding and
+    ``keys.bin`` the matching ``KEY_SIZE``-byte keys in the same order. Rows
+    are appended before their keys, so a crash can only leave orphan rows or
+    a partial key, which are truncated before the next append.
+
+    Several processes can share the cache: appends hold an exclusive lock on
+    ``keys.lock`` and first pick up the keys the other processes appended
+    since, so rows always line up with their keys.
+    """
+
+    def __init__(self, path: str, dimensoes: int) -> None:
+        os.makedirs(path, exist_ok=True)
+
+        self.dimensoes = dimensoes
+        self.keys_path = os.path.join(path, "keys.bin")
+        self.vectors_path = os.path.join(path, "vectors.f32")
+        self.lock_path = os.path.join(path, "keys.lock")
+        self.lock = threading.Lock()
+        self.linhas: dict[bytes, int] = {}
+        self.total = 0
+        self._vectors: Optional[np.memmap] = None
+
+        with self._exclusive():
+            self._sync()
+
+    def __len__(self) -> int:
+        return len(self.linhas)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self.linhas
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        with self.lock, open(self.lock_path, "ab") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _sync(self) -> None:
+        # Must hold the exclusive lock: drops whatever a crashed writer left
+        # past the last complete key and row, and reads the keys appended by
+        # the other processes.
+        with open(self.keys_path, "ab+") as f:
+            tamanho = f.seek(0, os.SEEK_END)
+            f.truncate(tamanho - tamanho % KEY_SIZE)
+            f.seek(self.total * KEY_SIZE)
+            keys = f.read()
+
+        for inicio in range(0, len(keys), KEY_SIZE):
+            self.linhas[keys[inicio : inicio + KEY_SIZE]] = self.total
+            self.total += 1
+
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(self.total * self.dimensoes * 4)
+
+    def refresh(self) -> None:
+        """Pick up the embeddings other processes appended since."""
+        with self._exclusive():
+            self._sync()
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        linha = self.linhas.get(key)
+
+        if linha is None:
+            return None
+
+        with self.lock:
+            if self._vectors is None or len(self._vectors) <= linha:
+                self._vectors = np.memmap(
+                    self.vectors_path,
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(self.total, self.dimensoes),
+                )
+
+            return self._vectors[linha]
+
+    def put_many(self, keys: list[bytes], vetores: np.ndarray) -> None:
+        vetores = np.ascontiguousarray(vetores, dtype=np.float32)
+
+        with self._exclusive():
+            self._sync()
+            # Another process may have embedded some of them meanwhile.
+            novos = [
+                indice for indice, key in enumerate(keys) if key not in self.linhas
+            ]
+
+            if not novos:
+                return
+
+            with open(self.vectors_path, "ab") as f:
+                f.write(vetores[novos].tobytes())
+
+            with open(self.keys_path, "ab") as f:
+                f.write(b"".join(keys[indice] for indice in novos))
+
+            for indice in novos:
+                self.linhas[keys[indice]] = self.total
+                self.total += 1
+
+
+class Embedder:
+    """Embeds texts with the OpenAI API, batching requests and reusing the
+    vectors already in the cache so unchanged texts are never re-embedded."""
+
+    def __init__(self, client, cache: EmbeddingCache, model: str, batch_size: int):
+        self.client = client
+        self.cache = cache
+        self.model = model
+        self.batch_size = batch_size
+
+    def embed(self, textos: list[str]) -> list[np.ndarray]:
+        keys = [embedding_key(self.model, texto) for texto in textos]
+        faltando = {}
+
+        for key, texto in zip(keys, textos):
+            if key not in self.cache:
+                faltando.setdefault(key, texto)
+
+        if faltando:
+            # Other processes sharing the cache may have embedded them.
+            self.cache.refresh()
+            faltando = {
+                key: texto for key, texto in faltando.items() if key not in self.cache
+            }
+
+        faltando = list(faltando.items())
+
+        for inicio in range(0, len(faltando), self.batch_size):
+            lote = faltando[inicio : inicio + self.batch_size]
+            resposta = self.client.embeddings.create(
+                model=self.model, input=[texto for _, texto in lote]
+            )
+            vetores = np.array(
+                [
+                    dado.embedding
+                    for dado in sorted(resposta.data, key=lambda dado: dado.index)
+                ],
+                dtype=np.float32,
+            )
+            self.cache.put_many([key for key, _ in lote], vetores)
+
+        return [self.cache.get(key) for key in keys]
@@ -0,0 +1,114 @@
+import logging
+import time
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from infolibras.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class BackpressureExtension:
+    """Throttles the crawl to the rate storage can sustain.
+
+    Every BACKPRESSURE_INTERVAL seconds it looks at the items waiting to be
+    written and at the write latency. Once the backlog reaches
+    BACKPRESSURE_HIGH_WATER items, or the latency BACKPRESSURE_MAX_LATENCY
+    seconds, the engine is paused and the concurrency of every downloader
+    slot halved. Requests already in flight finish, but no new ones are
+    scheduled until the backlog drains to BACKPRESSURE_LOW_WATER; slot
+    concurrency then doubles every interval until it is back to where it was.
+    """
+
+    def __init__(self, crawler, storage, high_water, low_water, max_latency, interval):
+        self.crawler = crawler
+        self.storage = storage
+        self.high_water = high_water
+        self.low_water = low_water
+        self.max_latency = max_latency
+        self.interval = interval
+        self.concorrencia = {}
+        self.pausado_em = None
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+
+        if not settings.getbool("BACKPRESSURE_ENABLED") or settings.getbool(
+            "INFOLIBRAS_SPOOL"
+        ):
+            raise NotConfigured
+
+        ext = cls(
+            crawler,
+            Storage.from_crawler(crawler),
+            high_water=settings.getint("BACKPRESSURE_HIGH_WATER", 5000),
+            low_water=settings.getint("BACKPRESSURE_LOW_WATER", 1000),
+            max_latency=settings.getfloat("BACKPRESSURE_MAX_LATENCY", 30.0),
+            interval=settings.getfloat("BACKPRESSURE_INTERVAL", 1.0),
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        self.task = task.LoopingCall(self.check)
+        self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+
+        if self.pausado_em is not None:
+            self._resume()
+
+    def check(self):
+        engine = self.crawler.engine
+        # The latency only moves when batches complete, so on its own it
+        # doesn't keep the crawl paused once the backlog has drained.
+        sobrecarregado = self.storage.backlog >= self.high_water or (
+            self.storage.latencia >= self.max_latency
+            and self.storage.backlog > self.low_water
+        )
+
+        if sobrecarregado:
+            if self.pausado_em is None:
+                self.pausado_em = time.monotonic()
+                engine.pause()
+                self.crawler.stats.inc_value("backpressure/pauses")
+                logger.info(
+                    "Pausing the crawl: %d items waiting for storage, %.1fs write "
+                    "latency",
+                    self.storage.backlog,
+                    self.storage.latencia,
+                )
+
+                # Once per pause: the engine is idle until it ends anyway.
+                for chave, slot in engine.downloader.slots.items():
+                    self.concorrencia.setdefault(chave, slot.concurrency)
+                    slot.concurrency = max(1, slot.concurrency // 2)
+
+            return
+
+        if self.pausado_em is not None:
+            if self.storage.backlog > self.low_water:
+                return
+
+            self._resume()
+
+        for chave, slot in engine.downloader.slots.items():
+            original = self.concorrencia.get(chave)
+
+            if original is not None and slot.concurrency < original:
+                slot.concurrency = min(original, slot.concurrency * 2)
+
+    def _resume(self):
+        self.crawler.stats.inc_value(
+            "backpressure/paused_seconds", time.monotonic() - self.pausado_em
+        )
+        self.pausado_em = None
+        self.crawler.engine.unpause()
+        logger.info("Resuming the crawl: %d items waiting", self.storage.backlog)
@@ -0,0 +1,106 @@
+import re
+from typing import Iterator, Optional
+
+from lxml import etree
+
+PARENTESES = re.compile(r"\([^)]*\)")
+VARIACAO = re.compile(r"^(.*)(\([^)]*\))$")
+
+
+def clean(texto: str) -> str:
+    return texto.strip().capitalize()
+
+
+def split_variacao(texto: str) -> tuple[str, Optional[str]]:
+    """Split ``"Termo (Variação)"`` into the term and the variation in
+    parentheses, both cleaned; the variation is None when there is none."""
+    correspondencia = VARIACAO.match(texto)
+
+    if correspondencia is None:
+        return texto, None
+
+    return clean(correspondencia.group(1)), clean(correspondencia.group(2)[1:-1])
+
+
+def strip_parenteses(texto: str) -> str:
+    return clean(PARENTESES.sub("", texto))
+
+
+class Field:
+    def __init__(self, xpath: str, todos: bool = False) -> None:
+        self.xpath = etree.XPath(xpath, smart_strings=False)
+        self.todos = todos
+
+    def __call__(self, no):
+        resultado = self.xpath(no)
+
+        if self.todos:
+            return resultado
+
+        return resultado[0] if resultado else None
+
+
+class Extractor:
+    """Declarative extraction of a page's entries.
+
+    ``entradas`` selects the node of each entry (the whole page by default)
+    and each keyword a ``Field`` evaluated against it, yielding one dict per
+    entry. The XPaths are compiled once, with the spider, and run directly on
+    the lxml tree the response already parsed.
+
+    Extractors given the entries' ``tag`` and a ``condicao`` equivalent to
+    ``entradas`` for an element of that tag can also ``stream`` the page.
+    """
+
+    def __init__(
+        self,
+        entradas: str = ".",
+        tag: Optional[str] = None,
+        condicao: str = "true()",
+        **campos: Field,
+    ) -> None:
+        self.entradas = etree.XPath(entradas)
+        self.tag = tag
+        self.condicao = etree.XPath(f"boolean({condicao})")
+        self.campos = campos
+
+    def __call__(self, response) -> Iterator[dict]:
+        for no in self.entradas(response.selector.root):
+            yield {nome: campo(no) for nome, campo in self.campos.items()}
+
+    def first(self, response) -> Optional[dict]:
+        return next(self(response), None)
+
+    def stream(self, response, tamanho: int = 65536) -> Iterator[dict]:
+        """Like calling the extractor, but parsing the body ``tamanho`` bytes
+        at a time and yielding each entry as soon as its element is closed.
+        Entries already extracted are dropped from the tree, so only the
+        current one and its ancestors are kept instead of the whole DOM.
+        Nested entries are yielded before the entry containing them."""
+        parser = etree.HTMLPullParser(
+            events=("end",), tag=self.tag, encoding=response.encoding
+        )
+        corpo = response.body
+
+        for inicio in range(0, len(corpo), tamanho):
+            parser.feed(corpo[inicio : inicio + tamanho])
+            yield from self._read_events(parser)
+
+        parser.close()
+        yield from self._read_events(parser)
+
+    def _read_events(self, parser) -> Iterator[dict]:
+        for _, elemento in parser.read_events():
+            if self.condicao(elemento):
+                yield {nome: campo(elemento) for nome, campo in self.campos.items()}
+
+            # An entry inside another one is still needed by the outer one.
+            pai = elemento.getparent()
+
+            if pai is None or next(elemento.iterancestors(self.tag), None) is not None:
+                continue
+
+            elemento.clear()
+
+            while elemento.getprevious() is not None:
+                del pai[0]
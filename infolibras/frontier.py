@@ -0,0 +1,448 @@
+import hashlib
+import logging
+import math
+import os
+import pickle
+import socket
+import sqlite3
+import time
+from collections import deque
+
+import numpy as np
+from scrapy import signals
+from scrapy.core.scheduler import BaseScheduler, Scheduler
+from scrapy.dupefilters import BaseDupeFilter
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.job import job_dir
+from scrapy.utils.misc import load_object
+from scrapy.utils.project import data_path
+from scrapy.utils.request import request_from_dict
+
+logger = logging.getLogger(__name__)
+
+# Sent by SharedFrontierDownloaderMiddleware for requests dropped before
+# reaching the downloader.
+request_dropped_by_middleware = object()
+
+
+def frontier_dir(crawler):
+    """JOBDIR if set, else a directory per spider under FRONTIER_DIR."""
+    diretorio = job_dir(crawler.settings)
+
+    if diretorio is None:
+        diretorio = os.path.join(
+            crawler.settings.get("FRONTIER_DIR") or data_path("frontier"),
+            crawler.spidercls.name,
+        )
+        os.makedirs(diretorio, exist_ok=True)
+
+    return diretorio
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over a memory-mapped bit array.
+
+    Sized for ``capacidade`` keys at a false positive rate of ``taxa_erro``,
+    so memory stays constant however many keys are added; past the capacity
+    the false positive rate grows. Positions come from double hashing one
+    blake2b digest of the key.
+    """
+
+    def __init__(self, path: str, capacidade: int, taxa_erro: float) -> None:
+        self.bits = math.ceil(-capacidade * math.log(taxa_erro) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.bits / capacidade * math.log(2)))
+        self.path = path
+
+        tamanho = (self.bits + 7) // 8
+        modo = "w+"
+
+        if os.path.exists(path):
+            if os.path.getsize(path) == tamanho:
+                modo = "r+"
+            else:
+                logger.warning("Discarding %s, made for another capacity", path)
+
+        self.array = np.memmap(path, dtype=np.uint8, mode=modo, shape=(tamanho,))
+
+    def _posicoes(self, chave: bytes):
+        digest = hashlib.blake2b(chave, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, chave: bytes) -> bool:
+        """Add ``chave``, returning whether it was (probably) there already."""
+        presente = True
+
+        for posicao in self._posicoes(chave):
+            byte, bit = divmod(posicao, 8)
+            mascara = 1 << bit
+
+            if not self.array[byte] & mascara:
+                presente = False
+                self.array[byte] |= mascara
+
+        return presente
+
+    def close(self) -> None:
+        self.array.flush()
+        del self.array
+
+
+class BloomDupeFilter(BaseDupeFilter):
+    """Request dupefilter backed by a BloomFilter in the frontier directory.
+
+    The filter survives restarts, so a resumed crawl skips what it already
+    fetched. It is dropped when the crawl finishes, so the next crawl
+    revisits every page, unless FRONTIER_PERSIST is set.
+    """
+
+    def __init__(
+        self, path, capacidade, taxa_erro, fingerprinter, persist=False, debug=False
+    ):
+        self.path = path
+        self.capacidade = capacidade
+        self.taxa_erro = taxa_erro
+        self.fingerprinter = fingerprinter
+        self.persist = persist
+        self.debug = debug
+        self.logdupes = True
+        self.filtro = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+
+        return cls(
+            os.path.join(frontier_dir(crawler), "requests.bloom"),
+            settings.getint("FRONTIER_CAPACITY", 10_000_000),
+            settings.getfloat("FRONTIER_ERROR_RATE", 0.001),
+            crawler.request_fingerprinter,
+            persist=settings.getbool("FRONTIER_PERSIST"),
+            debug=settings.getbool("DUPEFILTER_DEBUG"),
+        )
+
+    def open(self):
+        self.filtro = BloomFilter(self.path, self.capacidade, self.taxa_erro)
+
+    def request_seen(self, request):
+        return self.filtro.add(self.fingerprinter.fingerprint(request))
+
+    def close(self, reason):
+        self.filtro.close()
+
+        if reason == "finished" and not self.persist:
+            os.remove(self.path)
+
+    def log(self, request, spider):
+        if self.debug:
+            logger.debug(
+                "Filtered duplicate request: %(request)s", {"request": request}
+            )
+        elif self.logdupes:
+            logger.debug(
+                "Filtered duplicate request: %(request)s - no more duplicates will be "
+                "shown (see DUPEFILTER_DEBUG to show all duplicates)",
+                {"request": request},
+            )
+            self.logdupes = False
+
+        spider.crawler.stats.inc_value("dupefilter/filtered")
+
+
+class FrontierScheduler(Scheduler):
+    """Scheduler that always keeps its request queue on disk.
+
+    Without JOBDIR, each spider gets its own directory under FRONTIER_DIR,
+    so pending requests don't pile up in memory and an interrupted crawl
+    resumes from its queue on the next run.
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+
+        return cls(
+            dupefilter=load_object(settings["DUPEFILTER_CLASS"]).from_crawler(crawler),
+            jobdir=frontier_dir(crawler),
+            dqclass=load_object(settings["SCHEDULER_DISK_QUEUE"]),
+            mqclass=load_object(settings["SCHEDULER_MEMORY_QUEUE"]),
+            logunser=settings.getbool("SCHEDULER_DEBUG"),
+            stats=crawler.stats,
+            pqclass=load_object(settings["SCHEDULER_PRIORITY_QUEUE"]),
+            crawler=crawler,
+        )
+
+
+PENDENTE, ALUGADA, FEITA, FALHOU = range(4)
+
+SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS requisicao (
+    spider TEXT NOT NULL,
+    fingerprint BLOB NOT NULL,
+    prioridade INTEGER NOT NULL,
+    dados BLOB NOT NULL,
+    estado INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_ate REAL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (spider, fingerprint)
+);
+CREATE INDEX IF NOT EXISTS requisicao_fila
+    ON requisicao (spider, estado, prioridade DESC);
+"""
+
+
+class SharedFrontier:
+    """Request frontier in a SQLite file shared by several crawl processes.
+
+    Every request is stored once per spider, keyed by its fingerprint, so a
+    URL enqueued by several workers is fetched once. Workers lease batches
+    of pending requests for ``visibility_timeout`` seconds and mark them done
+    when they leave the downloader; leases that expire (a worker died) are
+    handed out again, up to ``max_tentativas`` times.
+
+    SQLite locking is only reliable on a local filesystem: workers on other
+    nodes need this same interface over a networked store.
+    """
+
+    def __init__(
+        self, path, spider, worker, visibility_timeout=300.0, max_tentativas=3
+    ):
+        self.spider = spider
+        self.worker = worker
+        self.visibility_timeout = visibility_timeout
+        self.max_tentativas = max_tentativas
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SHARED_SCHEMA)
+
+    def push(self, fingerprint, prioridade, dados, forcar=False):
+        """Store a request, returning whether it was new. With ``forcar`` a
+        request this worker already leased is made pending again (retries)."""
+        if forcar:
+            cur = self.conn.execute(
+                "UPDATE requisicao SET estado = ?, dados = ?, prioridade = ?,"
+                " worker = NULL, lease_ate = NULL"
+                " WHERE spider = ? AND fingerprint = ? AND worker = ?",
+                (PENDENTE, dados, prioridade, self.spider, fingerprint, self.worker),
+            )
+
+            if cur.rowcount:
+                return True
+
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO requisicao (spider, fingerprint, prioridade, dados)"
+            " VALUES (?, ?, ?, ?)",
+            (self.spider, fingerprint, prioridade, dados),
+        )
+        return cur.rowcount > 0
+
+    def reset_if_done(self):
+        """Forget a finished crawl of the spider, so the next one starts
+        over."""
+        self.conn.execute(
+            "DELETE FROM requisicao WHERE spider = ? AND NOT EXISTS (SELECT 1"
+            " FROM requisicao WHERE spider = ? AND estado IN (?, ?))",
+            (self.spider, self.spider, PENDENTE, ALUGADA),
+        )
+
+    def lease(self, quantidade):
+        agora = time.time()
+
+        self.conn.execute("BEGIN IMMEDIATE")
+
+        try:
+            self.conn.execute(
+                "UPDATE requisicao SET estado = ? WHERE spider = ? AND estado = ?"
+                " AND lease_ate < ? AND tentativas >= ?",
+                (FALHOU, self.spider, ALUGADA, agora, self.max_tentativas),
+            )
+            linhas = self.conn.execute(
+                "SELECT fingerprint, dados FROM requisicao WHERE spider = ?"
+                " AND (estado = ? OR (estado = ? AND lease_ate < ?))"
+                " ORDER BY prioridade DESC, rowid LIMIT ?",
+                (self.spider, PENDENTE, ALUGADA, agora, quantidade),
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE requisicao SET estado = ?, worker = ?, lease_ate = ?,"
+                " tentativas = tentativas + 1 WHERE spider = ? AND fingerprint = ?",
+                [
+                    (
+                        ALUGADA,
+                        self.worker,
+                        agora + self.visibility_timeout,
+                        self.spider,
+                        fingerprint,
+                    )
+                    for fingerprint, _ in linhas
+                ],
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        return linhas
+
+    def ack(self, fingerprint):
+        self.conn.execute(
+            "UPDATE requisicao SET estado = ? WHERE spider = ? AND fingerprint = ?"
+            " AND worker = ? AND estado = ?",
+            (FEITA, self.spider, fingerprint, self.worker, ALUGADA),
+        )
+
+    def release(self):
+        # Leases still held when the worker stops go back to the queue.
+        self.conn.execute(
+            "UPDATE requisicao SET estado = ?, worker = NULL, lease_ate = NULL,"
+            " tentativas = tentativas - 1 WHERE spider = ? AND worker = ? AND estado = ?",
+            (PENDENTE, self.spider, self.worker, ALUGADA),
+        )
+
+    def pending(self):
+        """Requests not done yet, including those leased by other workers."""
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM requisicao WHERE spider = ? AND estado IN (?, ?)",
+            (self.spider, PENDENTE, ALUGADA),
+        ).fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+class SharedFrontierScheduler(BaseScheduler):
+    """Scheduler for running one spider in several worker processes.
+
+    Requests go to the SharedFrontier in FRONTIER_DB, and each worker leases
+    FRONTIER_LEASE_SIZE of them at a time. A worker keeps running while any
+    request of the spider is pending or leased by another worker, since an
+    expired lease comes back to the queue. See `scrapy crawlworkers`.
+
+    Requests are marked done when they get a response, leave the downloader
+    or are dropped by a downloader middleware before reaching it (offsite,
+    robots.txt), which SharedFrontierDownloaderMiddleware reports.
+    """
+
+    def __init__(
+        self, crawler, path, worker, lease_size, visibility_timeout, max_tentativas
+    ):
+        self.crawler = crawler
+        self.path = path
+        self.worker = worker
+        self.lease_size = lease_size
+        self.visibility_timeout = visibility_timeout
+        self.max_tentativas = max_tentativas
+        self.fingerprinter = crawler.request_fingerprinter
+        self.fila = deque()
+        self.frontier = None
+        self.spider = None
+        self.vazia_em = 0.0
+        self.contado_em = 0.0
+        self.pendentes = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+
+        return cls(
+            crawler,
+            settings.get("FRONTIER_DB") or data_path("frontier.sqlite3"),
+            settings.get("FRONTIER_WORKER") or f"{socket.gethostname()}-{os.getpid()}",
+            lease_size=settings.getint("FRONTIER_LEASE_SIZE", 16),
+            visibility_timeout=settings.getfloat("FRONTIER_VISIBILITY_TIMEOUT", 300.0),
+            max_tentativas=settings.getint("FRONTIER_MAX_ATTEMPTS", 3),
+        )
+
+    def open(self, spider):
+        self.spider = spider
+        self.frontier = SharedFrontier(
+            self.path,
+            spider.name,
+            self.worker,
+            self.visibility_timeout,
+            self.max_tentativas,
+        )
+        self.frontier.reset_if_done()
+        # Responses returned by downloader middlewares (cache, replay) never
+        # reach the downloader, hence both signals.
+        self.crawler.signals.connect(self.done, signal=signals.response_received)
+        self.crawler.signals.connect(self.done, signal=signals.request_left_downloader)
+        self.crawler.signals.connect(self.done, signal=request_dropped_by_middleware)
+
+    def close(self, reason):
+        self.frontier.release()
+        self.frontier.close()
+
+    def done(self, request, spider, **kwargs):
+        self.frontier.ack(self.fingerprinter.fingerprint(request))
+
+    def enqueue_request(self, request):
+        novo = self.frontier.push(
+            self.fingerprinter.fingerprint(request),
+            request.priority,
+            pickle.dumps(request.to_dict(spider=self.spider), protocol=4),
+            forcar=request.dont_filter,
+        )
+
+        if novo:
+            self.vazia_em = 0.0
+            self.crawler.stats.inc_value("scheduler/enqueued/shared")
+        else:
+            self.crawler.stats.inc_value("dupefilter/filtered")
+
+        return novo
+
+    def next_request(self):
+        if not self.fila and time.monotonic() - self.vazia_em >= 1:
+            # Poll the shared store at most once a second while it is empty.
+            linhas = self.frontier.lease(self.lease_size)
+
+            if not linhas:
+                self.vazia_em = time.monotonic()
+
+            for _, dados in linhas:
+                self.fila.append(
+                    request_from_dict(pickle.loads(dados), spider=self.spider)
+                )
+
+        if not self.fila:
+            return None
+
+        self.crawler.stats.inc_value("scheduler/dequeued/shared")
+        return self.fila.popleft()
+
+    def has_pending_requests(self):
+        if self.fila:
+            return True
+
+        if time.monotonic() - self.contado_em >= 1:
+            self.pendentes = self.frontier.pending()
+            self.contado_em = time.monotonic()
+
+        return self.pendentes > 0
+
+
+class SharedFrontierDownloaderMiddleware:
+    # Exceptions raised by downloader middlewares' process_request (e.g.
+    # IgnoreRequest from OffsiteMiddleware or RobotsTxtMiddleware) never reach
+    # the downloader, so no signal tells SharedFrontierScheduler the request
+    # is done and its lease would only clear once it expired.
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        scheduler = load_object(crawler.settings["SCHEDULER"])
+
+        if not issubclass(scheduler, SharedFrontierScheduler):
+            raise NotConfigured
+
+        return cls(crawler)
+
+    def process_exception(self, request, exception, spider):
+        self.crawler.signals.send_catch_log(
+            request_dropped_by_middleware, request=request, spider=spider
+        )
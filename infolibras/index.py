@@ -0,0 +1,74 @@
+import hashlib
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+VARIACAO = b"v:"
+DEFINICAO = b"d:"
+
+
+class Entrada:
+    __slots__ = ("id", "variacoes", "definicoes", "digest", "importado")
+
+    def __init__(self, id: int) -> None:
+        self.id = id
+        self.variacoes: set[str] = set()
+        self.definicoes: set[str] = set()
+        # Digest of the variations and definitions stored in MySQL, and its
+        # value when the term was last imported into Typesense (None if it
+        # never was): the document only needs importing when they differ.
+        self.digest = 0
+        self.importado: Optional[int] = None
+
+    def written(self, tipo: bytes, hash: str) -> None:
+        """Fold the chave/hash of a stored variation (``VARIACAO``) or
+        definition (``DEFINICAO``) into the digest. XOR keeps it independent
+        of the order rows were written; hashing with the kind keeps a
+        variation and a definition of the same text from cancelling out."""
+        self.digest ^= int.from_bytes(
+            hashlib.blake2b(tipo + hash.encode(), digest_size=16).digest(), "big"
+        )
+
+
+class TermoIndex:
+    """In-memory view of the termo, variacao and definicao tables.
+
+    Maps each normalized termo to an Entrada holding its id, its normalized
+    variations and the hashes of its definitions. While ``completo`` is true
+    the index mirrors the whole database, so a miss means the termo is new;
+    once more than ``max_termos`` terms are seen the least recently used ones
+    are evicted and misses have to be looked up in the database.
+    """
+
+    def __init__(self, max_termos: int) -> None:
+        self.max_termos = max_termos
+        self.entradas: OrderedDict[str, Entrada] = OrderedDict()
+        self.completo = True
+
+    def __len__(self) -> int:
+        return len(self.entradas)
+
+    @property
+    def cheio(self) -> bool:
+        return len(self.entradas) >= self.max_termos
+
+    def get(self, chave: str) -> Optional[Entrada]:
+        entrada = self.entradas.get(chave)
+
+        if entrada is not None:
+            self.entradas.move_to_end(chave)
+
+        return entrada
+
+    def add(self, chave: str, entrada: Entrada) -> None:
+        self.entradas[chave] = entrada
+        self.entradas.move_to_end(chave)
+
+        while len(self.entradas) > self.max_termos:
+            self.entradas.popitem(last=False)
+            self.completo = False
+
+    def invalidate(self, chaves: Iterable[str]) -> None:
+        for chave in chaves:
+            self.entradas.pop(chave, None)
+
+        self.completo = False
@@ -1,8 +1,78 @@
-import scrapy
+from types import MappingProxyType
 
+import msgspec
+from itemadapter.adapter import AdapterInterface, ItemAdapter
 
-class DefinicaoItem(scrapy.Item):
-    termo = scrapy.Field()
-    variacoes = scrapy.Field()
-    definicao = scrapy.Field()
-    fonte = scrapy.Field()
+
+class Variacao(msgspec.Struct, array_like=True, gc=False):
+    variacao: str
+    explicacao: str = ""
+
+
+class DefinicaoItem(msgspec.Struct, kw_only=True, array_like=True, gc=False):
+    # Slotted and untracked by the garbage collector (items never reference
+    # themselves), and encoded as a plain array by msgspec, which is the
+    # spool segment format.
+    termo: str
+    variacoes: list[Variacao] = []
+    definicao: str
+    fonte: str
+
+
+class StructAdapter(AdapterInterface):
+    """Lets Scrapy (pipelines, feed exports, ItemAdapter) handle
+    ``msgspec.Struct`` items."""
+
+    @classmethod
+    def is_item_class(cls, item_class):
+        return isinstance(item_class, type) and issubclass(item_class, msgspec.Struct)
+
+    @classmethod
+    def get_field_meta_from_class(cls, item_class, field_name):
+        if field_name not in item_class.__struct_fields__:
+            raise KeyError(
+                f"{item_class.__name__} does not support field: {field_name}"
+            )
+
+        return MappingProxyType({})
+
+    @classmethod
+    def get_field_names_from_class(cls, item_class):
+        return list(item_class.__struct_fields__)
+
+    def __getitem__(self, field_name):
+        if field_name in self.item.__struct_fields__:
+            try:
+                return getattr(self.item, field_name)
+            except AttributeError:
+                pass
+
+        raise KeyError(field_name)
+
+    def __setitem__(self, field_name, value):
+        if field_name not in self.item.__struct_fields__:
+            raise KeyError(
+                f"{self.item.__class__.__name__} does not support field: {field_name}"
+            )
+
+        setattr(self.item, field_name, value)
+
+    def __delitem__(self, field_name):
+        if field_name not in self.item.__struct_fields__:
+            raise KeyError(field_name)
+
+        try:
+            delattr(self.item, field_name)
+        except AttributeError:
+            raise KeyError(field_name) from None
+
+    def __iter__(self):
+        return (
+            nome for nome in self.item.__struct_fields__ if hasattr(self.item, nome)
+        )
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+ItemAdapter.ADAPTER_CLASSES.appendleft(StructAdapter)
@@ -0,0 +1,319 @@
+import itertools
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+from infolibras.profiler import profiler
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    __slots__ = ("contagens", "soma", "maximo")
+
+    def __init__(self) -> None:
+        self.contagens = [0] * (len(BUCKETS) + 1)
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    @property
+    def total(self) -> int:
+        return sum(self.contagens)
+
+    def observe(self, segundos: float) -> None:
+        self.contagens[bisect_left(BUCKETS, segundos)] += 1
+        self.soma += segundos
+        self.maximo = max(self.maximo, segundos)
+
+
+class Metrics:
+    """Timing histograms and counters for the pipeline stages and spider
+    callbacks of every crawler running in the process.
+
+    With a ``sample_rate`` below 1, ``time`` only measures that fraction of
+    the calls of each stage, which keeps the overhead of per-response timers
+    negligible in production. Histogram counts are then sample counts.
+    """
+
+    def __init__(self, sample_rate: float = 1.0) -> None:
+        self.lock = threading.Lock()
+        self.histogramas: dict[str, Histogram] = {}
+        self.contadores: dict[str, int] = {}
+        self.intervalo = max(1, round(1 / sample_rate)) if sample_rate > 0 else 0
+        self.chamadas: dict[str, itertools.count] = {}
+
+    _shared = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        # One instance per process, shared by the storage writers, the spider
+        # middlewares and the extension of every crawler. Callback timings are
+        # already keyed by spider name; see publish for the rest.
+        if cls._shared is None:
+            cls._shared = cls(crawler.settings.getfloat("METRICS_SAMPLE_RATE", 1.0))
+
+        metrics = cls._shared
+
+        if getattr(crawler, "infolibras_metrics", None) is None:
+            crawler.infolibras_metrics = metrics
+            crawler.signals.connect(
+                lambda spider: metrics.publish(crawler.stats, spider.name),
+                signal=signals.spider_closed,
+                weak=False,
+            )
+
+        return metrics
+
+    def inc(self, nome: str, valor: int = 1) -> None:
+        with self.lock:
+            self.contadores[nome] = self.contadores.get(nome, 0) + valor
+
+    def observe(self, nome: str, segundos: float) -> None:
+        with self.lock:
+            histograma = self.histogramas.get(nome)
+
+            if histograma is None:
+                histograma = self.histogramas[nome] = Histogram()
+
+            histograma.observe(segundos)
+
+    def sampled(self, nome: str) -> bool:
+        if self.intervalo == 1:
+            return True
+
+        if not self.intervalo:
+            return False
+
+        chamadas = self.chamadas.get(nome)
+
+        if chamadas is None:
+            chamadas = self.chamadas.setdefault(nome, itertools.count())
+
+        return next(chamadas) % self.intervalo == 0
+
+    @contextmanager
+    def time(self, nome: str):
+        with profiler.label(f"pipeline/{nome}"):
+            if not self.sampled(nome):
+                yield
+                return
+
+            inicio = time.perf_counter()
+
+            try:
+                yield
+            finally:
+                self.observe(nome, time.perf_counter() - inicio)
+
+    def publish(self, stats, spider: str) -> None:
+        """Set the spider's callback timings as ``infolibras/parse/<spider>/*``
+        stats. The storage stages and counters are shared by every crawler of
+        the process, so they go under ``infolibras/process/*``."""
+        with self.lock:
+            for nome, valor in self.contadores.items():
+                stats.set_value(f"infolibras/process/{nome}", valor)
+
+            for nome, histograma in self.histogramas.items():
+                if not nome.startswith("parse/"):
+                    prefixo = f"infolibras/process/{nome}"
+                elif nome.startswith(f"parse/{spider}/"):
+                    prefixo = f"infolibras/{nome}"
+                else:
+                    continue
+
+                stats.set_value(f"{prefixo}/count", histograma.total)
+                stats.set_value(f"{prefixo}/seconds", round(histograma.soma, 6))
+                stats.set_value(f"{prefixo}/max_seconds", round(histograma.maximo, 6))
+
+    def prometheus(self, labels: str = "") -> str:
+        linhas = []
+
+        with self.lock:
+            for nome, valor in sorted(self.contadores.items()):
+                linhas.append(
+                    f"infolibras_{_metric_name(nome)}_total{{{labels}}} {valor}"
+                )
+
+            for nome, histograma in sorted(self.histogramas.items()):
+                base = f'stage="{nome}"' + (f",{labels}" if labels else "")
+                acumulado = 0
+
+                for limite, contagem in zip(BUCKETS, histograma.contagens):
+                    acumulado += contagem
+                    linhas.append(
+                        f'infolibras_stage_seconds_bucket{{{base},le="{limite}"}}'
+                        f" {acumulado}"
+                    )
+
+                linhas.append(
+                    f'infolibras_stage_seconds_bucket{{{base},le="+Inf"}}'
+                    f" {histograma.total}"
+                )
+                linhas.append(
+                    f"infolibras_stage_seconds_sum{{{base}}} {histograma.soma}"
+                )
+                linhas.append(
+                    f"infolibras_stage_seconds_count{{{base}}} {histograma.total}"
+                )
+
+        return "\n".join(linhas) + "\n"
+
+
+def _metric_name(nome: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", nome)
+
+
+class MetricsSpiderMiddleware:
+    # Times every spider callback, per spider and callback name, as the time
+    # spent producing its output. Keep it close to the spider (high order) so
+    # the other middlewares are not measured.
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(Metrics.from_crawler(crawler))
+
+    def _nome(self, response, spider):
+        callback = getattr(response.request, "callback", None) or spider.parse
+        return f"parse/{spider.name}/{callback.__name__}"
+
+    def process_spider_output(self, response, result, spider):
+        nome = self._nome(response, spider)
+
+        if not self.metrics.sampled(nome) and not profiler.ativo:
+            yield from result
+            return
+
+        resultado = iter(result)
+        duracao = 0.0
+
+        while True:
+            inicio = time.perf_counter()
+
+            try:
+                with profiler.label(nome):
+                    saida = next(resultado)
+            except StopIteration:
+                break
+            finally:
+                duracao += time.perf_counter() - inicio
+
+            yield saida
+
+        self.metrics.observe(nome, duracao)
+
+    async def process_spider_output_async(self, response, result, spider):
+        nome = self._nome(response, spider)
+
+        if not self.metrics.sampled(nome) and not profiler.ativo:
+            async for saida in result:
+                yield saida
+            return
+
+        resultado = result.__aiter__()
+        duracao = 0.0
+
+        while True:
+            inicio = time.perf_counter()
+
+            try:
+                with profiler.label(nome):
+                    saida = await resultado.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                duracao += time.perf_counter() - inicio
+
+            yield saida
+
+        self.metrics.observe(nome, duracao)
+
+
+class MetricsResource(Resource):
+    isLeaf = True
+
+    def __init__(self, crawlers, metrics):
+        super().__init__()
+        self.crawlers = crawlers
+        self.metrics = metrics
+
+    def render_GET(self, request):
+        request.setHeader(b"Content-Type", b"text/plain; version=0.0.4")
+
+        linhas = [self.metrics.prometheus()]
+
+        for crawler in self.crawlers:
+            spider = getattr(crawler.spider, "name", "")
+            labels = f'spider="{spider}"'
+
+            for chave, valor in sorted(crawler.stats.get_stats().items()):
+                if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                    linhas.append(f"scrapy_{_metric_name(chave)}{{{labels}}} {valor}\n")
+
+        return "".join(linhas).encode()
+
+
+class MetricsExtension:
+    # Serves the process metrics and the numeric stats of every running
+    # crawler in the Prometheus text format on METRICS_HOST:METRICS_PORT.
+    # Crawlers started in the same process share one listener, which stops
+    # when the last of them closes.
+
+    crawlers = []
+    listener = None
+
+    def __init__(self, crawler, host, port):
+        self.crawler = crawler
+        self.host = host
+        self.port = port
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getint("METRICS_PORT"):
+            raise NotConfigured
+
+        ext = cls(
+            crawler,
+            crawler.settings.get("METRICS_HOST", "127.0.0.1"),
+            crawler.settings.getint("METRICS_PORT"),
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        MetricsExtension.crawlers.append(self.crawler)
+
+        if MetricsExtension.listener is not None:
+            return
+
+        from twisted.internet import reactor
+
+        MetricsExtension.listener = reactor.listenTCP(
+            self.port,
+            Site(
+                MetricsResource(
+                    MetricsExtension.crawlers, Metrics.from_crawler(self.crawler)
+                )
+            ),
+            interface=self.host,
+        )
+        spider.logger.info("Serving metrics on http://%s:%d/", self.host, self.port)
+
+    def spider_closed(self, spider):
+        MetricsExtension.crawlers.remove(self.crawler)
+
+        if MetricsExtension.crawlers or MetricsExtension.listener is None:
+            return
+
+        listener, MetricsExtension.listener = MetricsExtension.listener, None
+        return listener.stopListening()
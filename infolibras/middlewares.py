@@ -3,9 +3,22 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import hashlib
+import sqlite3
+
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter, is_item
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.utils.project import data_path
+
+from infolibras.pipelines import items_failed, items_stored
+
+# Sent by IncrementalSpiderMiddleware for each item a callback returns, before
+# it reaches the pipelines, and once the callback has returned all its output,
+# with the number of items in it.
+item_parsed = object()
+response_parsed = object()
 
 
 class InfolibrasSpiderMiddleware:
@@ -100,3 +113,205 @@ class InfolibrasDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class PaginaPendente:
+    __slots__ = ("linha", "itens", "armazenados")
+
+    def __init__(self, linha):
+        self.linha = linha
+        self.itens = None
+        self.armazenados = 0
+
+
+class IncrementalDownloaderMiddleware:
+    # Remembers the ETag, Last-Modified and body hash of every page fetched
+    # and sends conditional requests on the next crawl. Pages answered with
+    # 304, or whose body hash didn't change, are dropped before reaching the
+    # spider, so they are neither parsed nor sent through the pipeline.
+    #
+    # A page is only recorded once its callback returned (see
+    # IncrementalSpiderMiddleware) and all its items were written to storage,
+    # so a page whose parsing or storage failed is fetched again next time.
+    #
+    # Requests with meta["incremental"] = False (e.g. index pages whose links
+    # must always be followed) are fetched and parsed unconditionally.
+
+    def __init__(self, path, stats):
+        self.stats = stats
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pagina ("
+            " url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, hash TEXT)"
+        )
+        # Fetched pages not recorded yet, by URL, and the URL of each of
+        # their items not stored yet, by item id.
+        self.paginas = {}
+        self.itens = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("INCREMENTAL_ENABLED"):
+            raise NotConfigured
+
+        s = cls(
+            crawler.settings.get("INCREMENTAL_DB") or data_path("incremental.db"),
+            crawler.stats,
+        )
+        crawler.signals.connect(s.response_parsed, signal=response_parsed)
+        crawler.signals.connect(s.item_parsed, signal=item_parsed)
+        crawler.signals.connect(s.item_dropped, signal=signals.item_dropped)
+        crawler.signals.connect(s.item_error, signal=signals.item_error)
+        crawler.signals.connect(s.failed, signal=signals.spider_error)
+        crawler.signals.connect(s.items_stored, signal=items_stored)
+        crawler.signals.connect(s.items_failed, signal=items_failed)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_request(self, request, spider):
+        if not request.meta.get("incremental", True):
+            return None
+
+        pagina = self.conn.execute(
+            "SELECT etag, last_modified FROM pagina WHERE url = ?", (request.url,)
+        ).fetchone()
+
+        if pagina is not None:
+            etag, last_modified = pagina
+
+            if etag:
+                request.headers.setdefault("If-None-Match", etag)
+
+            if last_modified:
+                request.headers.setdefault("If-Modified-Since", last_modified)
+
+        return None
+
+    def process_response(self, request, response, spider):
+        if not request.meta.get("incremental", True):
+            return response
+
+        if response.status == 304:
+            self.stats.inc_value("incremental/not_modified", spider=spider)
+            raise IgnoreRequest(f"Not modified: {response.url}")
+
+        if response.status != 200:
+            return response
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        hash = hashlib.blake2b(response.body, digest_size=16).hexdigest()
+
+        pagina = self.conn.execute(
+            "SELECT hash FROM pagina WHERE url = ?", (request.url,)
+        ).fetchone()
+
+        if pagina is not None and pagina[0] == hash:
+            self.stats.inc_value("incremental/unchanged", spider=spider)
+            raise IgnoreRequest(f"Unchanged: {response.url}")
+
+        self.paginas[response.url] = PaginaPendente(
+            (
+                request.url,
+                etag.decode("latin-1") if etag else None,
+                last_modified.decode("latin-1") if last_modified else None,
+                hash,
+            )
+        )
+        return response
+
+    def response_parsed(self, response, itens):
+        pagina = self.paginas.get(response.url)
+
+        if pagina is not None:
+            pagina.itens = itens
+            self._record(response.url, pagina)
+
+    def item_parsed(self, item, response):
+        if response.url in self.paginas:
+            self.itens[id(item)] = response.url
+
+    def item_dropped(self, item, response):
+        url = self.itens.pop(id(item), None)
+        pagina = self.paginas.get(url)
+
+        if pagina is not None:
+            pagina.armazenados += 1
+            self._record(url, pagina)
+
+    def item_error(self, item, response):
+        self.paginas.pop(self.itens.pop(id(item), None), None)
+
+    def items_stored(self, items):
+        for item in items:
+            url = self.itens.pop(id(item), None)
+            pagina = self.paginas.get(url)
+
+            if pagina is not None:
+                pagina.armazenados += 1
+                self._record(url, pagina)
+
+    def items_failed(self, items):
+        for item in items:
+            self.paginas.pop(self.itens.pop(id(item), None), None)
+
+    def failed(self, response):
+        self.paginas.pop(response.url, None)
+
+    def _record(self, url, pagina):
+        if pagina.itens is None or pagina.armazenados < pagina.itens:
+            return
+
+        del self.paginas[url]
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pagina (url, etag, last_modified, hash)"
+            " VALUES (?, ?, ?, ?)",
+            pagina.linha,
+        )
+        self.conn.commit()
+
+    def spider_closed(self, spider):
+        self.conn.close()
+
+
+class IncrementalSpiderMiddleware:
+    # Tells IncrementalDownloaderMiddleware which page each item comes from,
+    # before any pipeline stores it, and when a callback is done and how many
+    # items it produced. Keep it close to the engine (low order) so it
+    # only counts the items that reach the pipelines.
+
+    def __init__(self, signals):
+        self.signals = signals
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("INCREMENTAL_ENABLED"):
+            raise NotConfigured
+
+        return cls(crawler.signals)
+
+    def process_spider_output(self, response, result, spider):
+        itens = 0
+
+        for saida in result:
+            if is_item(saida):
+                itens += 1
+                self.signals.send_catch_log(item_parsed, item=saida, response=response)
+
+            yield saida
+
+        self.signals.send_catch_log(response_parsed, response=response, itens=itens)
+
+    async def process_spider_output_async(self, response, result, spider):
+        itens = 0
+
+        async for saida in result:
+            if is_item(saida):
+                itens += 1
+                self.signals.send_catch_log(item_parsed, item=saida, response=response)
+
+            yield saida
+
+        self.signals.send_catch_log(response_parsed, response=response, itens=itens)
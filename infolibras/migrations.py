@@ -0,0 +1,206 @@
+import logging
+
+from pypika import MySQLQuery as Query
+
+from infolibras.db import definicao_tb, termo_tb, variacao_tb
+from infolibras.utils import chave_hash, definicao_hash
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def _column_exists(cur, table, column):
+    cur.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS"
+        " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column),
+    )
+    return cur.fetchone()[0] > 0
+
+
+def _index_exists(cur, table, index):
+    cur.execute(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS"
+        " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (table, index),
+    )
+    return cur.fetchone()[0] > 0
+
+
+def add_definicao_hash(conn):
+    cur = conn.cursor()
+
+    if not _column_exists(cur, "definicao", "hash"):
+        cur.execute("ALTER TABLE `definicao` ADD COLUMN `hash` CHAR(32) NULL")
+
+    while True:
+        cur.execute(
+            Query.from_(definicao_tb)
+            .select(definicao_tb.id, definicao_tb.definicao)
+            .where(definicao_tb.hash.isnull())
+            .orderby(definicao_tb.id)
+            .limit(BACKFILL_CHUNK_SIZE)
+            .get_sql()
+        )
+        rows = cur.fetchall()
+
+        if not rows:
+            break
+
+        cur.executemany(
+            "UPDATE `definicao` SET `hash` = %s WHERE `id` = %s",
+            [(definicao_hash(definicao), id) for id, definicao in rows],
+        )
+        conn.commit()
+
+    if not _index_exists(cur, "definicao", "definicao_idTermo_hash"):
+        cur.execute(
+            "DELETE `d` FROM `definicao` `d` JOIN `definicao` `o`"
+            " ON `o`.`idTermo` = `d`.`idTermo` AND `o`.`hash` = `d`.`hash`"
+            " AND `o`.`id` < `d`.`id`"
+        )
+        logger.info("Removed %d duplicated definitions", cur.rowcount)
+
+        cur.execute(
+            "ALTER TABLE `definicao` MODIFY `hash` CHAR(32) NOT NULL,"
+            " ADD UNIQUE INDEX `definicao_idTermo_hash` (`idTermo`, `hash`)"
+        )
+
+    conn.commit()
+    cur.close()
+
+
+def _backfill_chave(conn, cur, table, column):
+    if not _column_exists(cur, table._table_name, "chave"):
+        cur.execute(
+            f"ALTER TABLE `{table._table_name}` ADD COLUMN `chave` CHAR(32) NULL"
+        )
+
+    while True:
+        cur.execute(
+            Query.from_(table)
+            .select(table.id, table[column])
+            .where(table.chave.isnull())
+            .orderby(table.id)
+            .limit(BACKFILL_CHUNK_SIZE)
+            .get_sql()
+        )
+        rows = cur.fetchall()
+
+        if not rows:
+            break
+
+        cur.executemany(
+            f"UPDATE `{table._table_name}` SET `chave` = %s WHERE `id` = %s",
+            [(chave_hash(texto), id) for id, texto in rows],
+        )
+        conn.commit()
+
+
+def add_termo_chave(conn):
+    # A unique key on the normalized term makes get-or-create safe when
+    # several crawl processes write at once: a concurrent INSERT IGNORE of
+    # the same term waits for the first one and is then skipped.
+    cur = conn.cursor()
+
+    _backfill_chave(conn, cur, termo_tb, "termo")
+
+    if not _index_exists(cur, "termo", "termo_chave"):
+        duplicados = (
+            # DISTINCT keeps MySQL from merging the derived table into the
+            # DELETE from termo below, which it would reject.
+            "SELECT DISTINCT `d`.`id` `id`, `o`.`id` `original`"
+            " FROM `termo` `d` JOIN (SELECT `chave`, MIN(`id`) `id` FROM `termo`"
+            " GROUP BY `chave` HAVING COUNT(*) > 1) `o` ON `o`.`chave` = `d`.`chave`"
+            " AND `d`.`id` > `o`.`id`"
+        )
+
+        # Move variations and definitions to the oldest copy of the term;
+        # rows that already exist there are left behind and deleted.
+        for table in ("variacao", "definicao"):
+            cur.execute(
+                f"UPDATE IGNORE `{table}` `t` JOIN ({duplicados}) `d`"
+                " ON `d`.`id` = `t`.`idTermo` SET `t`.`idTermo` = `d`.`original`"
+            )
+            cur.execute(
+                f"DELETE `t` FROM `{table}` `t` JOIN ({duplicados}) `d`"
+                " ON `d`.`id` = `t`.`idTermo`"
+            )
+
+        cur.execute(f"DELETE `t` FROM `termo` `t` JOIN ({duplicados}) `d` USING (`id`)")
+        logger.info("Merged %d duplicated terms", cur.rowcount)
+
+        cur.execute(
+            "ALTER TABLE `termo` MODIFY `chave` CHAR(32) NOT NULL,"
+            " ADD UNIQUE INDEX `termo_chave` (`chave`)"
+        )
+
+    conn.commit()
+    cur.close()
+
+
+def add_variacao_chave(conn):
+    cur = conn.cursor()
+
+    _backfill_chave(conn, cur, variacao_tb, "variacao")
+
+    if not _index_exists(cur, "variacao", "variacao_idTermo_chave"):
+        cur.execute(
+            "DELETE `v` FROM `variacao` `v` JOIN `variacao` `o`"
+            " ON `o`.`idTermo` = `v`.`idTermo` AND `o`.`chave` = `v`.`chave`"
+            " AND `o`.`id` < `v`.`id`"
+        )
+        logger.info("Removed %d duplicated variations", cur.rowcount)
+
+        cur.execute(
+            "ALTER TABLE `variacao` MODIFY `chave` CHAR(32) NOT NULL,"
+            " ADD UNIQUE INDEX `variacao_idTermo_chave` (`idTermo`, `chave`)"
+        )
+
+    conn.commit()
+    cur.close()
+
+
+def add_termo_pendente(conn):
+    # Set with the rows of a term whose document has to be imported into
+    # Typesense and cleared once it is; existing terms are taken as imported.
+    cur = conn.cursor()
+
+    if not _column_exists(cur, "termo", "pendente"):
+        cur.execute(
+            "ALTER TABLE `termo` ADD COLUMN `pendente` TINYINT(1) NOT NULL DEFAULT 0"
+        )
+
+    conn.commit()
+    cur.close()
+
+
+def add_definicao_mesclada(conn):
+    # Hashes of the definitions dropped as near-duplicates of one the term
+    # already had, so later crawls skip them without comparing them again.
+    cur = conn.cursor()
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS `definicao_mesclada` ("
+        " `idTermo` INT NOT NULL, `hash` CHAR(32) NOT NULL,"
+        " PRIMARY KEY (`idTermo`, `hash`))"
+    )
+    conn.commit()
+    cur.close()
+
+
+# Every migration must be idempotent: `scrapy migrate` runs all of them in
+# order each time it is invoked.
+MIGRATIONS = [
+    add_definicao_hash,
+    add_termo_chave,
+    add_variacao_chave,
+    add_termo_pendente,
+    add_definicao_mesclada,
+]
+
+
+def migrate(conn):
+    for migration in MIGRATIONS:
+        logger.info("Applying migration %s", migration.__name__)
+        migration(conn)
@@ -1,280 +1,129 @@
-import os
-from typing import Optional
+import logging
 
-import mysql.connector
-import numpy as np
-import typesense
-from dotenv import dotenv_values
-from numpy.linalg import norm
-from openai import OpenAI
-from pypika import MySQLQuery as Query
-from pypika import Table
-from slugify import slugify
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.log import failure_to_exc_info
+from scrapy.utils.project import data_path
+from twisted.internet import defer, task
 
+from infolibras.profiler import profiler
+from infolibras.spool import SpoolWriter
+from infolibras.storage import Storage
 
-class TypedTable(Table):
-    __table__ = ""
+logger = logging.getLogger(__name__)
 
-    def __init__(
-        self,
-        name: Optional[str] = None,
-        schema: Optional[str] = None,
-        alias: Optional[str] = None,
-        query_cls: Optional[Query] = None,
-    ) -> None:
-        if name is None:
-            if self.__table__:
-                name = self.__table__
-            else:
-                name = self.__class__.__name__
-
-        super().__init__(name, schema, alias, query_cls)
-
-
-class Termo(TypedTable):
-    __table__ = "termo"
-
-    id: int
-    termo: str
-    slug: str
-
-
-class Variacao(TypedTable):
-    __table__ = "variacao"
-
-    id: int
-    idTermo: int
-    variacao: str
-    slug: str
-
-
-class Definicao(TypedTable):
-    __table__ = "definicao"
-
-    id: int
-    idTermo: int
-    definicao: str
-    fonte: str
-
-
-termo_tb = Termo()
-variacao_tb = Variacao()
-definicao_tb = Definicao()
-
-
-def cosine_similarity(a: list[float], b: list[float]) -> float:
-    return np.dot(a, b) / (norm(a) * norm(b))
+# Sent with the items once they are written to storage (or the spool), or
+# once writing them failed.
+items_stored = object()
+items_failed = object()
 
 
 class InfolibrasPipeline:
-    def __init__(self):
-        env = dotenv_values()
-
-        self.openai = OpenAI(api_key=env["OPENAI_API_KEY"])
-
-        self.conn = mysql.connector.connect(
-            host=env["DB_HOST"],
-            port=int(env["DB_PORT"]),
-            user=env["DB_USER"],
-            password=env["DB_PASSWORD"],
-            database=env["DB_NAME"],
-        )
-
-        self.cur = self.conn.cursor()
-
-        self.client = typesense.Client(
-            {
-                "nodes": [
-                    {
-                        "host": env["TYPESENSE_HOST"],
-                        "port": int(env["TYPESENSE_PORT"]),
-                        "protocol": env["TYPESENSE_PROTOCOL"],
-                    }
-                ],
-                "api_key": env["TYPESENSE_API_KEY"],
-                "connection_timeout_seconds": 2,
-            }
+    def __init__(self, storage, signals, batch_size=100, batch_interval=5.0):
+        self.storage = storage
+        self.signals = signals
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.buffer = []
+        self.flush_task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if crawler.settings.getbool("INFOLIBRAS_SPOOL"):
+            raise NotConfigured
+
+        return cls(
+            Storage.from_crawler(crawler),
+            crawler.signals,
+            batch_size=crawler.settings.getint("INFOLIBRAS_BATCH_SIZE", 100),
+            batch_interval=crawler.settings.getfloat("INFOLIBRAS_BATCH_INTERVAL", 5.0),
         )
 
-        if "gooli-termos" not in tuple(
-            map(
-                lambda collection: collection["name"],
-                self.client.collections.retrieve(),
-            )
-        ):
-            self.client.collections.create(
-                {
-                    "name": "gooli-termos",
-                    "fields": [
-                        {"name": "termo", "type": "string"},
-                        {"name": "variacoes", "type": "string[]"},
-                        {"name": "definicoes", "type": "string[]"},
-                        {"name": "quantidade_definicoes", "type": "int32"},
-                        {
-                            "name": "contem_video",
-                            "type": "bool",
-                            "optional": True,
-                            "index": False,
-                        },
-                        {
-                            "name": "categorias",
-                            "type": "string[]",
-                            "optional": True,
-                            "facet": True,
-                        },
-                        {"name": "slug", "type": "string"},
-                        {
-                            "name": "embedding",
-                            "type": "float[]",
-                            "embed": {
-                                "from": ["termo", "variacoes", "definicoes"],
-                                "model_config": {
-                                    "model_name": "openai/text-embedding-3-large",
-                                    "api_key": os.getenv("OPENAI_API_KEY"),
-                                },
-                            },
-                        },
-                    ],
-                }
-            )
+    def open_spider(self, spider):
+        self.flush_task = task.LoopingCall(self.flush)
+        self.flush_task.start(self.batch_interval, now=False)
 
-            self.client.collections.create(
-                {
-                    "name": "gooli-termos-queries",
-                    "fields": [
-                        {"name": "q", "type": "string"},
-                        {"name": "count", "type": "int32"},
-                    ],
-                }
-            )
-
-            self.client.analytics.rules.upsert(
-                "gooli-termos-queries-aggregation",
-                {
-                    "type": "popular_queries",
-                    "params": {
-                        "source": {"collections": ["gooli-termos"]},
-                        "destination": {"collection": "gooli-termos-queries"},
-                        "limit": 1000,
-                    },
-                },
-            )
+        return self.storage.open()
 
     def process_item(self, item, spider):
-        item.setdefault("variacoes", [])
-
-        self.cur.execute(
-            Query.from_(termo_tb)
-            .select("id")
-            .where(termo_tb.termo == item["termo"])
-            .get_sql()
-        )
-
-        termo = self.cur.fetchone()
+        with profiler.label("pipeline/process_item"):
+            self.buffer.append(item)
 
-        if termo is None:
-            self.cur.execute(
-                Query.into(termo_tb)
-                .columns(termo_tb.termo, termo_tb.slug)
-                .insert(item["termo"], slugify(item["termo"]))
-                .get_sql()
-            )
-            termo_id = self.cur.lastrowid
-            self.cur.execute(
-                Query.into(variacao_tb)
-                .columns(variacao_tb.idTermo, variacao_tb.variacao, variacao_tb.slug)
-                .insert(termo_id, item["termo"], slugify(item["termo"]))
-                .get_sql()
-            )
-        else:
-            termo_id = termo[0]
+            # The buffer is split between the storage writers, each of which
+            # should still get about batch_size items.
+            if len(self.buffer) >= self.batch_size * len(self.storage.writers):
+                self.flush()
 
-        self.cur.execute(
-            Query.from_(definicao_tb)
-            .select(termo_tb.id)
-            .where(
-                (definicao_tb.idTermo == termo_id) & (definicao_tb.definicao)
-                == item["definicao"]
-            )
-            .get_sql()
-        )
+        return item
 
-        definicao = self.cur.fetchone()
+    def flush(self):
+        items, self.buffer = self.buffer, []
 
-        if definicao is None:
-            self.cur.execute(
-                Query.into(definicao_tb)
-                .columns(
-                    definicao_tb.idTermo, definicao_tb.definicao, definicao_tb.fonte
-                )
-                .insert(termo_id, item["definicao"], item["fonte"])
-                .get_sql()
-            )
+        if not items:
+            return defer.succeed(None)
 
-        for variacao in item["variacoes"]:
-            self.cur.execute(
-                Query.from_(variacao_tb)
-                .select(variacao_tb.id)
-                .where(
-                    (variacao_tb.idTermo == termo_id) & (variacao_tb.variacao)
-                    == variacao["variacao"]
-                )
-                .get_sql()
-            )
-            variacao_id = self.cur.fetchone()
+        # Writes run on the reactor thread pool so storage round trips don't
+        # block the crawl; the storage writers keep each term's batches in order.
+        d = self.storage.submit(items)
+        d.addCallbacks(self._stored, self._log_failure, (items,), None, (items,))
+        return d
 
-            if variacao_id is None:
-                self.cur.execute(
-                    Query.into(variacao_tb)
-                    .columns(
-                        variacao_tb.idTermo, variacao_tb.variacao, variacao_tb.slug
-                    )
-                    .insert(
-                        termo_id, variacao["variacao"], slugify(variacao["variacao"])
-                    )
-                    .get_sql()
-                )
-                variacao_id = self.cur.lastrowid
+    def _stored(self, _, items):
+        self.signals.send_catch_log(items_stored, items=items)
 
-        try:
-            document = (
-                self.client.collections["gooli-termos"].documents[termo_id].retrieve()
-            )
+    def _log_failure(self, failure, items):
+        logger.error(
+            "Failed to write a batch of %d items",
+            len(items),
+            exc_info=failure_to_exc_info(failure),
+        )
+        self.signals.send_catch_log(items_failed, items=items)
 
-            self.client.collections["gooli-termos"].documents[str(termo_id)].update(
-                {
-                    "variacoes": list(
-                        set(
-                            document["variacoes"]
-                            + [item["termo"]]
-                            + [variacao["variacao"] for variacao in item["variacoes"]]
-                        )
-                    ),
-                    "quantidade_definicoes": document["quantidade_definicoes"] + 1,
-                    "definicoes": list(
-                        set(document["definicoes"] + [item["definicao"]])
-                    ),
-                }
-            )
+    def close_spider(self, spider):
+        if self.flush_task is not None and self.flush_task.running:
+            self.flush_task.stop()
+
+        # Items are reported stored before the crawler's spider_closed.
+        d = self.flush()
+        d.addCallback(lambda _: self.storage.close())
+        return d
+
+
+class SpoolPipeline:
+    # Spool mode (INFOLIBRAS_SPOOL): items are only appended to segment files
+    # in INFOLIBRAS_SPOOL_DIR, to be written to storage later by
+    # `scrapy load`.
+
+    def __init__(self, diretorio, signals, formato="msgpack", max_registros=10_000):
+        self.diretorio = diretorio
+        self.signals = signals
+        self.formato = formato
+        self.max_registros = max_registros
+        self.writer = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+
+        if not settings.getbool("INFOLIBRAS_SPOOL"):
+            raise NotConfigured
+
+        return cls(
+            settings.get("INFOLIBRAS_SPOOL_DIR") or data_path("spool", createdir=True),
+            crawler.signals,
+            formato=settings.get("INFOLIBRAS_SPOOL_FORMAT", "msgpack"),
+            max_registros=settings.getint("INFOLIBRAS_SPOOL_SEGMENT_ITEMS", 10_000),
+        )
 
-        except typesense.exceptions.ObjectNotFound:
-            self.client.collections["gooli-termos"].documents.create(
-                {
-                    "id": str(termo_id),
-                    "termo": item["termo"],
-                    "variacoes": [item["termo"]]
-                    + [variacao["variacao"] for variacao in item["variacoes"]],
-                    "definicoes": [item["definicao"]],
-                    "quantidade_definicoes": 1,
-                    "contem_video": False,
-                    "slug": slugify(item["termo"]),
-                }
-            )
+    def open_spider(self, spider):
+        self.writer = SpoolWriter(
+            self.diretorio, spider.name, self.formato, self.max_registros
+        )
 
-        self.conn.commit()
+    def process_item(self, item, spider):
+        self.writer.write(item)
+        self.signals.send_catch_log(items_stored, items=[item])
 
         return item
 
     def close_spider(self, spider):
-        self.cur.close()
-        self.conn.close()
+        self.writer.close()
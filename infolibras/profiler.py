@@ -0,0 +1,194 @@
+import logging
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.extensions.telnet import update_telnet_vars
+from scrapy.utils.project import data_path
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """Statistical profiler of labelled code sections.
+
+    Code runs under a label (``with profiler.label("parse/ditech/parse")``)
+    and, while the profiler is started, a background thread samples the
+    stack of every labelled thread each ``intervalo`` seconds, counting
+    stacks per label. Unlabelled threads are not sampled, so idle reactor
+    time doesn't show up. ``dump`` writes one collapsed-stack file per label
+    (``frame;frame;frame count`` lines), the input format of flamegraph.pl
+    and speedscope.
+    """
+
+    def __init__(self, intervalo: float = 0.005) -> None:
+        self.intervalo = intervalo
+        self.ativo = False
+        self.rotulos: dict[int, str] = {}
+        self.amostras: dict[str, Counter] = {}
+        self.thread = None
+
+    @contextmanager
+    def label(self, nome: str):
+        if not self.ativo:
+            yield
+            return
+
+        thread = threading.get_ident()
+        anterior = self.rotulos.get(thread)
+        self.rotulos[thread] = nome
+
+        try:
+            yield
+        finally:
+            if anterior is None:
+                self.rotulos.pop(thread, None)
+            else:
+                self.rotulos[thread] = anterior
+
+    def start(self) -> None:
+        if self.ativo:
+            return
+
+        self.ativo = True
+        self.thread = threading.Thread(
+            target=self._run, name="infolibras-profiler", daemon=True
+        )
+        self.thread.start()
+        logger.info("Profiler started, sampling every %.3fs", self.intervalo)
+
+    def stop(self) -> None:
+        if not self.ativo:
+            return
+
+        self.ativo = False
+        self.thread.join()
+        self.thread = None
+        self.rotulos.clear()
+        logger.info("Profiler stopped")
+
+    def toggle(self) -> None:
+        if self.ativo:
+            self.stop()
+        else:
+            self.start()
+
+    def _run(self) -> None:
+        proprio = threading.get_ident()
+
+        while self.ativo:
+            time.sleep(self.intervalo)
+            frames = sys._current_frames()
+
+            for thread, nome in list(self.rotulos.items()):
+                frame = frames.get(thread)
+
+                if frame is None or thread == proprio:
+                    continue
+
+                pilha = []
+
+                while frame is not None:
+                    codigo = frame.f_code
+                    funcao = getattr(codigo, "co_qualname", codigo.co_name)
+                    pilha.append(f"{frame.f_globals.get('__name__')}:{funcao}")
+                    frame = frame.f_back
+
+                pilha.reverse()
+                self.amostras.setdefault(nome, Counter())[";".join(pilha)] += 1
+
+    def dump(self, diretorio: str) -> list:
+        """Write and reset the samples collected so far, returning the paths
+        written."""
+        amostras, self.amostras = self.amostras, {}
+        os.makedirs(diretorio, exist_ok=True)
+        paths = []
+
+        for nome, pilhas in amostras.items():
+            path = os.path.join(diretorio, re.sub(r"[^\w.-]", ".", nome) + ".folded")
+
+            with open(path, "a") as f:
+                for pilha, quantidade in pilhas.most_common():
+                    f.write(f"{pilha} {quantidade}\n")
+
+            paths.append(path)
+
+        return paths
+
+
+profiler = SamplingProfiler()
+
+
+class ProfilerExtension:
+    # Controls the process-wide profiler: started with the crawl when
+    # PROFILER_ENABLED is set, toggled at runtime with SIGUSR2 or from the
+    # telnet console (`profiler.toggle()`), and dumped to
+    # PROFILER_DIR/<pid> whenever it stops and when the last crawler closes.
+
+    crawlers = 0
+
+    def __init__(self, crawler, enabled, diretorio):
+        self.crawler = crawler
+        self.enabled = enabled
+        self.diretorio = diretorio
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+
+        if not settings.getbool("PROFILER_ENABLED") and not hasattr(signal, "SIGUSR2"):
+            raise NotConfigured
+
+        profiler.intervalo = settings.getfloat("PROFILER_INTERVAL", 0.005)
+        ext = cls(
+            crawler,
+            settings.getbool("PROFILER_ENABLED"),
+            os.path.join(
+                settings.get("PROFILER_DIR") or data_path("profiles"), str(os.getpid())
+            ),
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.telnet_vars, signal=update_telnet_vars)
+        return ext
+
+    def spider_opened(self, spider):
+        ProfilerExtension.crawlers += 1
+
+        if ProfilerExtension.crawlers == 1 and hasattr(signal, "SIGUSR2"):
+            signal.signal(signal.SIGUSR2, self._sigusr2)
+
+        if self.enabled:
+            profiler.start()
+
+    def _sigusr2(self, signum, frame):
+        from twisted.internet import reactor
+
+        reactor.callFromThread(self.toggle)
+
+    def toggle(self):
+        profiler.toggle()
+
+        if not profiler.ativo:
+            self.dump()
+
+    def dump(self):
+        for path in profiler.dump(self.diretorio):
+            logger.info("Wrote profile %s", path)
+
+    def telnet_vars(self, telnet_vars):
+        telnet_vars["profiler"] = self
+
+    def spider_closed(self, spider):
+        ProfilerExtension.crawlers -= 1
+
+        if ProfilerExtension.crawlers == 0:
+            profiler.stop()
+            self.dump()
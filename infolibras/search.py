@@ -0,0 +1,255 @@
+import json
+import logging
+import time
+
+from pypika import MySQLQuery as Query
+
+from infolibras import utils
+from infolibras.db import definicao_tb, termo_tb, variacao_tb
+
+logger = logging.getLogger(__name__)
+
+
+COLLECTION = "gooli-termos"
+QUERIES_COLLECTION = "gooli-termos-queries"
+QUERIES_RULE = "gooli-termos-queries-aggregation"
+
+# Set in Typesense only (categorias by add_categories.py), so they can't be
+# rebuilt from MySQL.
+TYPESENSE_FIELDS = ("categorias", "contem_video")
+
+
+def termos_schema(env, nome=COLLECTION):
+    return {
+        "name": nome,
+        "fields": [
+            {"name": "termo", "type": "string"},
+            {"name": "variacoes", "type": "string[]"},
+            {"name": "definicoes", "type": "string[]"},
+            {"name": "quantidade_definicoes", "type": "int32"},
+            {
+                "name": "contem_video",
+                "type": "bool",
+                "optional": True,
+                "index": False,
+            },
+            {
+                "name": "categorias",
+                "type": "string[]",
+                "optional": True,
+                "facet": True,
+            },
+            {"name": "slug", "type": "string"},
+            {
+                "name": "embedding",
+                "type": "float[]",
+                "embed": {
+                    "from": ["termo", "variacoes", "definicoes"],
+                    "model_config": {
+                        "model_name": "openai/text-embedding-3-large",
+                        "api_key": env.get("OPENAI_API_KEY"),
+                    },
+                },
+            },
+        ],
+    }
+
+
+QUERIES_SCHEMA = {
+    "name": QUERIES_COLLECTION,
+    "fields": [
+        {"name": "q", "type": "string"},
+        {"name": "count", "type": "int32"},
+    ],
+}
+
+QUERIES_RULE_SCHEMA = {
+    "type": "popular_queries",
+    "params": {
+        "source": {"collections": [COLLECTION]},
+        "destination": {"collection": QUERIES_COLLECTION},
+        "limit": 1000,
+    },
+}
+
+
+def client(env=None):
+    import typesense
+
+    if env is None:
+        env = utils.env()
+
+    return typesense.Client(
+        {
+            "nodes": [
+                {
+                    "host": env["TYPESENSE_HOST"],
+                    "port": int(env["TYPESENSE_PORT"]),
+                    "protocol": env["TYPESENSE_PROTOCOL"],
+                }
+            ],
+            "api_key": env["TYPESENSE_API_KEY"],
+            "connection_timeout_seconds": 2,
+        }
+    )
+
+
+def embedding_text(documento):
+    # Same fields, in the same order, as the embed.from of gooli-termos.
+    return " ".join(
+        [documento["termo"], *documento["variacoes"], *documento["definicoes"]]
+    )
+
+
+def build_documentos(cur, termo_ids):
+    documentos = {}
+
+    cur.execute(
+        Query.from_(termo_tb)
+        .select(termo_tb.id, termo_tb.termo, termo_tb.slug)
+        .where(termo_tb.id.isin(termo_ids))
+        .get_sql()
+    )
+
+    for termo_id, termo, slug in cur.fetchall():
+        documentos[termo_id] = {
+            "id": str(termo_id),
+            "termo": termo,
+            "variacoes": [],
+            "definicoes": [],
+            "slug": slug,
+        }
+
+    cur.execute(
+        Query.from_(variacao_tb)
+        .select(variacao_tb.idTermo, variacao_tb.variacao)
+        .where(variacao_tb.idTermo.isin(termo_ids))
+        .orderby(variacao_tb.id)
+        .get_sql()
+    )
+
+    for termo_id, variacao in cur.fetchall():
+        documentos[termo_id]["variacoes"].append(variacao)
+
+    cur.execute(
+        Query.from_(definicao_tb)
+        .select(definicao_tb.idTermo, definicao_tb.definicao)
+        .where(definicao_tb.idTermo.isin(termo_ids))
+        .orderby(definicao_tb.id)
+        .get_sql()
+    )
+
+    for termo_id, definicao in cur.fetchall():
+        documentos[termo_id]["definicoes"].append(definicao)
+
+    for documento in documentos.values():
+        documento["quantidade_definicoes"] = len(documento["definicoes"])
+
+    return list(documentos.values())
+
+
+def export_fields(collection, ids, campos=TYPESENSE_FIELDS):
+    """``campos`` of the documents ``ids`` of ``collection``, by document id,
+    for the documents that have any."""
+    exportados = collection.documents.export(
+        {
+            "filter_by": f"id:[{','.join(ids)}]",
+            "include_fields": ",".join(("id", *campos)),
+        }
+    )
+    resultado = {}
+
+    for linha in exportados.splitlines():
+        documento = json.loads(linha)
+        id = documento.pop("id")
+
+        if documento:
+            resultado[id] = documento
+
+    return resultado
+
+
+def add_embeddings(embedder, documentos):
+    # Typesense skips its own embedding when the field is already filled.
+    vetores = embedder.embed([embedding_text(documento) for documento in documentos])
+
+    for documento, vetor in zip(documentos, vetores):
+        documento["embedding"] = vetor.tolist()
+
+
+def import_documentos(collection, documentos, action):
+    """Bulk import ``documentos``, logging and returning the ids of the
+    documents Typesense rejected."""
+    if not documentos:
+        return []
+
+    resultados = collection.documents.import_(documentos, {"action": action})
+    rejeitados = []
+
+    for documento, resultado in zip(documentos, resultados):
+        if not resultado.get("success"):
+            rejeitados.append(documento["id"])
+            logger.error(
+                "Failed to index termo %s: %s",
+                documento["id"],
+                resultado.get("error"),
+            )
+
+    return rejeitados
+
+
+def collection_exists(client, nome):
+    from typesense.exceptions import ObjectNotFound
+
+    try:
+        client.collections[nome].retrieve()
+    except ObjectNotFound:
+        return False
+
+    return True
+
+
+def versioned_name(nome=COLLECTION):
+    return f"{nome}-v{time.strftime('%Y%m%d%H%M%S')}"
+
+
+def alias_target(client, alias):
+    """Name of the collection ``alias`` points to, or None if there's no
+    such alias."""
+    from typesense.exceptions import ObjectNotFound
+
+    try:
+        return client.aliases[alias].retrieve()["collection_name"]
+    except ObjectNotFound:
+        return None
+
+
+def swap_alias(client, alias, nome):
+    # Upserting an alias repoints it atomically; searches never see a gap.
+    client.aliases.upsert(alias, {"collection_name": nome})
+
+
+def bootstrap(client, env):
+    """Create the collections and analytics rule if they don't exist yet.
+
+    gooli-termos is created as an alias to a versioned collection, so
+    `scrapy reindex` can rebuild it and swap the alias without downtime. A
+    concrete gooli-termos collection made by an older bootstrap is kept as
+    is.
+    """
+    existentes = {collection["name"] for collection in client.collections.retrieve()}
+    criadas = []
+
+    if COLLECTION not in existentes and alias_target(client, COLLECTION) is None:
+        nome = versioned_name()
+        client.collections.create(termos_schema(env, nome))
+        swap_alias(client, COLLECTION, nome)
+        criadas.append(f"{COLLECTION} -> {nome}")
+
+    if QUERIES_COLLECTION not in existentes:
+        client.collections.create(QUERIES_SCHEMA)
+        criadas.append(QUERIES_COLLECTION)
+
+    client.analytics.rules.upsert(QUERIES_RULE, QUERIES_RULE_SCHEMA)
+
+    return criadas
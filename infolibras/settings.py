@@ -11,6 +11,7 @@ BOT_NAME = "infolibras"
 
 SPIDER_MODULES = ["infolibras.spiders"]
 NEWSPIDER_MODULE = "infolibras.spiders"
+COMMANDS_MODULE = "infolibras.commands"
 
 
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
@@ -33,6 +34,27 @@ REACTOR_THREADPOOL_MAXSIZE = 20
 # CONCURRENT_REQUESTS_PER_DOMAIN = 16
 # CONCURRENT_REQUESTS_PER_IP = 16
 
+# Keep the request queue on disk and filter duplicates with a fixed-size Bloom
+# filter, both in JOBDIR or FRONTIER_DIR/<spider>, so memory stays flat on
+# large fan-outs and an interrupted crawl resumes where it stopped. The filter
+# is dropped when a crawl finishes unless FRONTIER_PERSIST is set
+SCHEDULER = "infolibras.frontier.FrontierScheduler"
+DUPEFILTER_CLASS = "infolibras.frontier.BloomDupeFilter"
+# FRONTIER_DIR = ".scrapy/frontier"
+FRONTIER_CAPACITY = 10_000_000
+FRONTIER_ERROR_RATE = 0.001
+FRONTIER_PERSIST = False
+
+# Shared frontier used by `scrapy crawlworkers` (SCHEDULER =
+# "infolibras.frontier.SharedFrontierScheduler"): workers lease
+# FRONTIER_LEASE_SIZE requests at a time from the SQLite file FRONTIER_DB, and
+# a lease not completed within FRONTIER_VISIBILITY_TIMEOUT seconds is handed to
+# another worker, at most FRONTIER_MAX_ATTEMPTS times
+# FRONTIER_DB = ".scrapy/frontier.sqlite3"
+FRONTIER_LEASE_SIZE = 16
+FRONTIER_VISIBILITY_TIMEOUT = 300.0
+FRONTIER_MAX_ATTEMPTS = 3
+
 # Disable cookies (enabled by default)
 COOKIES_ENABLED = False
 
@@ -47,25 +69,133 @@ COOKIES_ENABLED = False
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-# SPIDER_MIDDLEWARES = {
-#    "infolibras.middlewares.InfolibrasSpiderMiddleware": 543,
-# }
+SPIDER_MIDDLEWARES = {
+    "infolibras.middlewares.IncrementalSpiderMiddleware": 10,
+    # "infolibras.middlewares.InfolibrasSpiderMiddleware": 543,
+    "infolibras.metrics.MetricsSpiderMiddleware": 950,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#    "infolibras.middlewares.InfolibrasDownloaderMiddleware": 543,
-# }
+DOWNLOADER_MIDDLEWARES = {
+    # "infolibras.middlewares.InfolibrasDownloaderMiddleware": 543,
+    # After HttpCompressionMiddleware (590), so it hashes decompressed bodies
+    "infolibras.middlewares.IncrementalDownloaderMiddleware": 585,
+    "infolibras.archive.ArchiveDownloaderMiddleware": 587,
+    # Only enabled with SharedFrontierScheduler
+    "infolibras.frontier.SharedFrontierDownloaderMiddleware": 990,
+}
+
+# Incremental recrawl: send conditional requests and skip pages that haven't
+# changed since the last crawl (INCREMENTAL_DB defaults to .scrapy/incremental.db).
+# A page counts as crawled once all its items are written to storage
+INCREMENTAL_ENABLED = False
+# INCREMENTAL_DB = ".scrapy/incremental.db"
+
+# Response archive: keep every decompressed response in compressed,
+# content-deduplicated segments of up to ARCHIVE_SEGMENT_SIZE bytes in
+# ARCHIVE_DIR, so `scrapy reparse <spider>` can re-extract items after a
+# parser fix without crawling again
+ARCHIVE_ENABLED = False
+# ARCHIVE_DIR = ".scrapy/archive"
+ARCHIVE_SEGMENT_SIZE = 256 * 1024 * 1024
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-# }
+EXTENSIONS = {
+    # "scrapy.extensions.telnet.TelnetConsole": None,
+    "infolibras.metrics.MetricsExtension": 500,
+    "infolibras.extensions.BackpressureExtension": 510,
+    "infolibras.profiler.ProfilerExtension": 520,
+}
+
+# Sampling profiler of spider callbacks and pipeline stages. Started with the
+# crawl when PROFILER_ENABLED is set; toggle it at runtime with
+# `kill -USR2 <pid>` or `profiler.toggle()` in the telnet console. Collapsed
+# stacks, one file per callback/stage, are written to PROFILER_DIR/<pid> each
+# time it stops (render with flamegraph.pl or speedscope)
+PROFILER_ENABLED = False
+# PROFILER_DIR = ".scrapy/profiles"
+PROFILER_INTERVAL = 0.005
+
+# Spider callback timings (infolibras/parse/<spider>/*) are published to the
+# stats when the spider closes, along with the pipeline stage timings and
+# counters (infolibras/process/*), which cover every crawler in the process.
+# Set METRICS_PORT to also serve them, with the numeric stats, in the
+# Prometheus text format while crawling.
+# METRICS_SAMPLE_RATE < 1 times only that fraction of the calls
+# METRICS_PORT = 9410
+METRICS_HOST = "127.0.0.1"
+METRICS_SAMPLE_RATE = 1.0
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-ITEM_PIPELINES = {"infolibras.pipelines.InfolibrasPipeline": 300}
+ITEM_PIPELINES = {
+    "infolibras.pipelines.InfolibrasPipeline": 300,
+    "infolibras.pipelines.SpoolPipeline": 310,
+}
+
+# The single-page glossaries (juliobattisti, douglasgaspar) are parsed
+# STREAMING_PARSE_CHUNK_SIZE bytes at a time, yielding each term as soon as
+# it is parsed and dropping it from the tree, instead of building the whole
+# page's DOM first
+STREAMING_PARSE = True
+STREAMING_PARSE_CHUNK_SIZE = 65536
+
+# Spool mode: instead of writing to MySQL and Typesense during the crawl, only
+# append items to rotating segment files in INFOLIBRAS_SPOOL_DIR (msgpack or
+# jsonl), and write them to storage later with `scrapy load`
+INFOLIBRAS_SPOOL = False
+# INFOLIBRAS_SPOOL_DIR = ".scrapy/spool"
+INFOLIBRAS_SPOOL_FORMAT = "msgpack"
+INFOLIBRAS_SPOOL_SEGMENT_ITEMS = 10_000
+
+# Buffer items in the pipeline and write them to MySQL in batches of about
+# INFOLIBRAS_BATCH_SIZE items per writer, flushing when the buffer is full or
+# every INFOLIBRAS_BATCH_INTERVAL seconds
+INFOLIBRAS_BATCH_SIZE = 100
+INFOLIBRAS_BATCH_INTERVAL = 5.0
+
+# Size of the MySQL connection pool shared by every crawler of the process
+# (see `scrapy crawlall`)
+INFOLIBRAS_DB_POOL_SIZE = 4
+
+# Number of storage writers. Items are split between them by termo, so
+# different terms are written to MySQL and Typesense in parallel while each
+# term is always handled by the same writer; every writer keeps a connection
+# (the pool grows to match) and INFOLIBRAS_INDEX_MAX_TERMS / INFOLIBRAS_WRITERS
+# terms in its index
+INFOLIBRAS_WRITERS = 4
+
+# Number of terms sent to Typesense per bulk import request
+INFOLIBRAS_TYPESENSE_BATCH_SIZE = 250
+
+# Pause the crawl when storage falls behind: once BACKPRESSURE_HIGH_WATER items
+# wait to be written (or a batch takes BACKPRESSURE_MAX_LATENCY seconds from
+# submit to commit), stop scheduling requests and halve the downloader slots'
+# concurrency until the backlog drains to BACKPRESSURE_LOW_WATER
+BACKPRESSURE_ENABLED = True
+BACKPRESSURE_HIGH_WATER = 5000
+BACKPRESSURE_LOW_WATER = 1000
+BACKPRESSURE_MAX_LATENCY = 30.0
+BACKPRESSURE_INTERVAL = 1.0
+
+# Maximum number of terms kept in the pipeline's in-memory term index. Larger
+# dictionaries fall back to database lookups for the least recently used terms
+INFOLIBRAS_INDEX_MAX_TERMS = 500_000
+
+# Definitions whose cosine similarity to an existing definition of the same
+# term reaches this threshold are merged into it instead of stored (0 disables)
+INFOLIBRAS_NEAR_DUPLICATE_THRESHOLD = 0.9
+
+# Embed Typesense documents client-side, in batches, caching the vectors on
+# disk (.scrapy/embeddings by default) by a hash of the embedded text. The
+# model must match the one configured on the gooli-termos embedding field
+INFOLIBRAS_EMBEDDINGS_ENABLED = True
+# INFOLIBRAS_EMBEDDING_CACHE_DIR = ".scrapy/embeddings"
+INFOLIBRAS_EMBEDDING_MODEL = "text-embedding-3-large"
+INFOLIBRAS_EMBEDDING_DIMENSIONS = 3072
+INFOLIBRAS_EMBEDDING_BATCH_SIZE = 256
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
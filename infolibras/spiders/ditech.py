@@ -1,85 +1,60 @@
-import re
-
 import scrapy
 
-from infolibras.items import DefinicaoItem
+from infolibras.extraction import Extractor, Field, clean, split_variacao
+from infolibras.items import DefinicaoItem, Variacao
 
-padrao = re.compile(r"^(.*)(\([^)]*\))$")
+links = Field("//*[@id = 'content']//li/a/@href", todos=True)
+pagina = Extractor(
+    titulo=Field(
+        "//h1[contains(concat(' ', normalize-space(@class), ' '), "
+        "' header-post-title-class ')]/text()"
+    ),
+    definicao=Field(
+        "//*[contains(concat(' ', normalize-space(@class), ' '), ' entry-content ')]"
+        "//p/text()"
+    ),
+)
 
 
 class DitechSpider(scrapy.Spider):
     name = "ditech"
-    allowed_domains = ["ditech.com.br"]
+    allowed_domains = ["dictech.com.br"]
     start_urls = ["https://www.dictech.com.br/dicionario/termos-tecnicos/informatica/"]
 
+    def start_requests(self):
+        # The index must always be parsed so changed term pages are found.
+        for url in self.start_urls:
+            yield scrapy.Request(url, dont_filter=True, meta={"incremental": False})
+
     def parse(self, response):
-        for link in response.css("#content li > a::attr(href)").extract():
-            yield scrapy.Request(link, callback=self.parse_term, dont_filter=True)
+        for link in links(response.selector.root):
+            yield scrapy.Request(link, callback=self.parse_term)
 
     def parse_term(self, response):
-        definicao = DefinicaoItem()
-        definicao["variacoes"] = []
-
-        termo = (
-            response.css("h1.header-post-title-class::text")
-            .extract_first()
-            .strip()
-            .capitalize()
-        )
-
-        correspondencia = padrao.match(termo)
-        tem_parenteses = correspondencia is not None
+        campos = pagina.first(response)
+        termo, variacao = split_variacao(clean(campos["titulo"]))
+        tem_parenteses = variacao is not None
+        variacoes = [Variacao(variacao)] if tem_parenteses else []
 
-        if correspondencia is not None:
-            termo = correspondencia.group(1).strip().capitalize()
-            variacao = correspondencia.group(2).strip()[1:-1].capitalize()
-            definicao["variacoes"] = [{"variacao": variacao, "explicacao": ""}]
-
-        definicao["termo"] = termo
-        definicao_infos = (
-            response.css(".entry-content p::text").extract_first().strip().split(": ")
-        )
+        definicao_infos = campos["definicao"].strip().split(": ")
 
         if len(definicao_infos) > 1:
-            definicao["definicao"] = "".join(definicao_infos[1:])
-            termo_info = definicao_infos[0].strip().capitalize()
-
-            correspondencia = padrao.match(termo_info)
-
-            if correspondencia is not None:
-                termo_info = correspondencia.group(1).strip().capitalize()
-
-                if termo_info != definicao["termo"] and (
-                    not tem_parenteses
-                    or termo_info != definicao["variacoes"][0]["variacao"]
-                ):
-                    definicao["variacoes"] = [
-                        {"variacao": termo_info, "explicacao": ""}
-                    ]
-
-                variacao = correspondencia.group(2).strip()[1:-1].capitalize()
-
-                if variacao != definicao["termo"] and (
-                    not tem_parenteses
-                    or variacao != definicao["variacoes"][0]["variacao"]
+            definicao = "".join(definicao_infos[1:])
+
+            # "Termo (Variação): definição" names the term again, possibly
+            # differently from the title: the last name that isn't the
+            # title's term or variation becomes the variation.
+            for nome in split_variacao(clean(definicao_infos[0])):
+                if (
+                    nome is not None
+                    and nome != termo
+                    and (not tem_parenteses or nome != variacoes[0].variacao)
                 ):
-                    definicao["variacoes"] = [{"variacao": variacao, "explicacao": ""}]
-
-            else:
-                if termo_info != definicao["termo"] and (
-                    not tem_parenteses
-                    or termo_info != definicao["variacoes"][0]["variacao"]
-                ):
-                    definicao["variacoes"] = [
-                        {
-                            "variacao": definicao_infos[0].strip().capitalize(),
-                            "explicacao": "",
-                        }
-                    ]
+                    variacoes = [Variacao(nome)]
 
         else:
-            definicao["definicao"] = definicao_infos[0].strip()
+            definicao = definicao_infos[0].strip()
 
-        definicao["fonte"] = response.url
-
-        yield definicao
+        yield DefinicaoItem(
+            termo=termo, variacoes=variacoes, definicao=definicao, fonte=response.url
+        )
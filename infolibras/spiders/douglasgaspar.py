@@ -1,8 +1,16 @@
-import re
-
 import scrapy
 
-from infolibras.items import DefinicaoItem
+from infolibras.extraction import Extractor, Field, clean, strip_parenteses
+from infolibras.items import DefinicaoItem, Variacao
+
+termos = Extractor(
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' content ')]//li",
+    tag="li",
+    condicao="ancestor::*[contains(concat(' ', normalize-space(@class), ' '), "
+    "' content ')]",
+    textos=Field(".//text()", todos=True),
+    variacao=Field(".//em/text()"),
+)
 
 
 class DouglasgasparSpider(scrapy.Spider):
@@ -13,33 +21,31 @@ class DouglasgasparSpider(scrapy.Spider):
     ]
 
     def parse(self, response):
-        for termo in response.css(".content li"):
-            text = termo.css("::text").extract()
-            variacao = termo.css("em::text").extract_first()
+        if self.settings.getbool("STREAMING_PARSE"):
+            entradas = termos.stream(
+                response, self.settings.getint("STREAMING_PARSE_CHUNK_SIZE")
+            )
+        else:
+            entradas = termos(response)
 
-            if len(text) > 0:
-                definicao = DefinicaoItem()
-                definicao["variacoes"] = (
-                    [{"variacao": variacao, "explicacao": ""}]
-                    if variacao is not None
-                    else []
-                )
-                definicao["fonte"] = (
-                    "https://douglasgaspar.wordpress.com/2020/03/17/glossario-com-termos-de-ti-informatica-e-programacao/"
-                )
+        for campos in entradas:
+            text = campos["textos"]
+            variacao = campos["variacao"]
 
+            if len(text) > 0:
                 if len(text) == 1:
                     text = text[0].split(" – ")
-                    definicao["termo"] = (
-                        re.sub(r"\([^)]*\)", "", text[0]).strip().capitalize()
-                    )
-                    definicao["definicao"] = "".join(text[1:]).strip().capitalize()
+                    nome = strip_parenteses(text[0])
+                    definicao = clean("".join(text[1:]))
 
                 else:
-                    definicao["termo"] = (
-                        re.sub(r"\([^)]*\)", "", text[0][:-2]).strip().capitalize()
+                    nome = strip_parenteses(text[0][:-2])
+                    definicao = clean(text[2][4:])
+
+                if definicao and nome:
+                    yield DefinicaoItem(
+                        termo=nome,
+                        variacoes=[Variacao(variacao)] if variacao is not None else [],
+                        definicao=definicao,
+                        fonte="https://douglasgaspar.wordpress.com/2020/03/17/glossario-com-termos-de-ti-informatica-e-programacao/",
                     )
-                    definicao["definicao"] = text[2][4:].strip().capitalize()
-
-                if definicao["definicao"] and definicao["termo"]:
-                    yield definicao
@@ -1,10 +1,17 @@
-import re
+from itertools import islice
 
 import scrapy
 
-from infolibras.items import DefinicaoItem
+from infolibras.extraction import Extractor, Field, clean, split_variacao
+from infolibras.items import DefinicaoItem, Variacao
 
-padrao = re.compile(r"^(.*)(\([^)]*\))$")
+termos = Extractor(
+    "//*[@id = 'conteudo_cont']//p[.//strong]",
+    tag="p",
+    condicao="ancestor::*[@id = 'conteudo_cont'] and .//strong",
+    termo=Field(".//strong/text()"),
+    textos=Field(".//text()", todos=True),
+)
 
 
 class JuliobattistiSpider(scrapy.Spider):
@@ -15,48 +22,29 @@ class JuliobattistiSpider(scrapy.Spider):
     ]
 
     def parse(self, response):
-        for termo in response.css("#conteudo_cont p:has(strong)")[2:]:
-            definicao = DefinicaoItem()
-            definicao["variacoes"] = []
-
-            termo_texto = (
-                termo.css("strong::text").extract_first()[:-2].strip().capitalize()
-            )
-            correspondencia = padrao.match(termo_texto)
-
-            if correspondencia is not None:
-                definicao["termo"] = correspondencia.group(1).strip().capitalize()
-                definicao["variacoes"].append(
-                    {
-                        "variacao": correspondencia.group(2)
-                        .strip()[1:-1]
-                        .strip()
-                        .capitalize(),
-                        "explicacao": "",
-                    }
-                )
-            else:
-                definicao["termo"] = termo_texto
-
-            definicao_texto = termo.css("::text").extract()[2].strip().capitalize()
-            correspondencia = padrao.match(definicao_texto)
-
-            if correspondencia is not None:
-                definicao["definicao"] = correspondencia.group(1).strip().capitalize()
-                definicao["variacoes"].append(
-                    {
-                        "variacao": correspondencia.group(2)
-                        .strip()[1:-1]
-                        .strip()
-                        .capitalize(),
-                        "explicacao": "",
-                    }
-                )
-            else:
-                definicao["definicao"] = definicao_texto
-
-            definicao["fonte"] = (
-                "https://www.juliobattisti.com.br/tutoriais/keniareis/dicionarioinfo001.asp"
+        if self.settings.getbool("STREAMING_PARSE"):
+            entradas = termos.stream(
+                response, self.settings.getint("STREAMING_PARSE_CHUNK_SIZE")
             )
+        else:
+            entradas = termos(response)
+
+        # The first two paragraphs are the page title and the "A" heading.
+        for campos in islice(entradas, 2, None):
+            variacoes = []
+            termo, variacao = split_variacao(clean(campos["termo"][:-2]))
+
+            if variacao is not None:
+                variacoes.append(Variacao(variacao))
 
-            yield definicao
+            definicao, variacao = split_variacao(clean(campos["textos"][2]))
+
+            if variacao is not None:
+                variacoes.append(Variacao(variacao))
+
+            yield DefinicaoItem(
+                termo=termo,
+                variacoes=variacoes,
+                definicao=definicao,
+                fonte="https://www.juliobattisti.com.br/tutoriais/keniareis/dicionarioinfo001.asp",
+            )
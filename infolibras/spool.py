@@ -0,0 +1,119 @@
+import glob
+import os
+import struct
+import time
+from typing import Iterator
+
+import msgspec
+
+from infolibras.items import DefinicaoItem
+
+FORMATS = ("msgpack", "jsonl")
+
+_LENGTH = struct.Struct(">I")
+
+
+class SpoolWriter:
+    """Appends records to rotating segment files in ``diretorio``.
+
+    A segment is written as ``<name>.part`` and renamed to its final name
+    once it holds ``max_registros`` records or the writer is closed, so the
+    loader only ever sees complete segments. msgpack segments store each
+    record prefixed by its big-endian uint32 length; jsonl segments one JSON
+    array per line.
+    """
+
+    def __init__(
+        self,
+        diretorio: str,
+        prefixo: str,
+        formato: str = "msgpack",
+        max_registros=10_000,
+    ) -> None:
+        if formato not in FORMATS:
+            raise ValueError(f"Unknown spool format {formato!r}")
+
+        os.makedirs(diretorio, exist_ok=True)
+
+        self.diretorio = diretorio
+        self.prefixo = f"{prefixo}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self.formato = formato
+        self.max_registros = max_registros
+        self.encoder = (
+            msgspec.msgpack.Encoder()
+            if formato == "msgpack"
+            else msgspec.json.Encoder()
+        )
+        self.sequencia = 0
+        self.registros = 0
+        self.arquivo = None
+        self.path = None
+
+    def write(self, item: DefinicaoItem) -> None:
+        if self.arquivo is None:
+            self.sequencia += 1
+            self.path = os.path.join(
+                self.diretorio, f"{self.prefixo}-{self.sequencia:05d}.{self.formato}"
+            )
+            self.arquivo = open(f"{self.path}.part", "wb")
+
+        dados = self.encoder.encode(item)
+
+        if self.formato == "msgpack":
+            self.arquivo.write(_LENGTH.pack(len(dados)))
+            self.arquivo.write(dados)
+        else:
+            self.arquivo.write(dados)
+            self.arquivo.write(b"\n")
+
+        self.registros += 1
+
+        if self.registros >= self.max_registros:
+            self.rotate()
+
+    def rotate(self) -> None:
+        if self.arquivo is None:
+            return
+
+        self.arquivo.close()
+        os.replace(f"{self.path}.part", self.path)
+        self.arquivo = None
+        self.registros = 0
+
+    close = rotate
+
+
+def segments(diretorio: str) -> list[str]:
+    return sorted(
+        path
+        for formato in FORMATS
+        for path in glob.glob(os.path.join(diretorio, f"*.{formato}"))
+    )
+
+
+def read_segment(path: str) -> Iterator[DefinicaoItem]:
+    if path.endswith(".jsonl"):
+        decoder = msgspec.json.Decoder(DefinicaoItem)
+
+        with open(path, "rb") as f:
+            for linha in f:
+                if linha.strip():
+                    yield decoder.decode(linha)
+
+        return
+
+    decoder = msgspec.msgpack.Decoder(DefinicaoItem)
+
+    with open(path, "rb") as f:
+        while cabecalho := f.read(_LENGTH.size):
+            (tamanho,) = _LENGTH.unpack(cabecalho)
+            yield decoder.decode(f.read(tamanho))
+
+
+def mark_done(path: str) -> str:
+    feitos = os.path.join(os.path.dirname(path), "done")
+    os.makedirs(feitos, exist_ok=True)
+
+    destino = os.path.join(feitos, os.path.basename(path))
+    os.replace(path, destino)
+    return destino
@@ -0,0 +1,826 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pypika import MySQLQuery as Query
+from pypika import functions as fn
+from scrapy.utils.misc import load_object
+from scrapy.utils.project import data_path
+from slugify import slugify
+from twisted.internet import defer, threads
+
+from infolibras import search, utils
+from infolibras.db import (
+    connect,
+    definicao_mesclada_tb,
+    definicao_tb,
+    termo_tb,
+    variacao_tb,
+)
+from infolibras.index import DEFINICAO, VARIACAO, Entrada, TermoIndex
+from infolibras.items import DefinicaoItem, Variacao
+from infolibras.metrics import Metrics
+from infolibras.utils import chave_hash, definicao_hash, normalize
+
+logger = logging.getLogger(__name__)
+
+# MySQL lock wait timeout and deadlock: the batch is rolled back and retried.
+RETRYABLE_ERRNOS = (1205, 1213)
+WRITE_ATTEMPTS = 3
+# Typesense or embedding failures are retried after IMPORT_RETRY_DELAY
+# seconds; a document Typesense rejects IMPORT_ATTEMPTS times is left for the
+# next run (the term stays flagged pendente).
+IMPORT_RETRY_DELAY = 30.0
+IMPORT_ATTEMPTS = 3
+
+
+def shard(chave: str, shards: int) -> int:
+    """Writer of the term whose ``chave_hash`` is ``chave``."""
+    return int(chave[:8], 16) % shards
+
+
+def shard_criterion(numero: int, shards: int):
+    """``shard(termo.chave, shards) == numero``, evaluated by MySQL."""
+    return (
+        fn.Function("CONV", fn.Substring(termo_tb.chave, 1, 8), 16, 10) % shards
+        == numero
+    )
+
+
+class ConnectionPool:
+    """Bounded pool of database connections made by ``connect(env)``.
+
+    Connections are created on demand up to ``size``; past that, ``get``
+    blocks until one is returned.
+    """
+
+    def __init__(self, connect, env, size):
+        self.connect = connect
+        self.env = env
+        self.size = size
+        self.livres = queue.LifoQueue()
+        self.criadas = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        try:
+            return self.livres.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            if self.criadas < self.size:
+                self.criadas += 1
+                return self.connect(self.env)
+
+        return self.livres.get()
+
+    def put(self, conn):
+        self.livres.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self.livres.get_nowait().close()
+            except queue.Empty:
+                break
+
+            with self.lock:
+                self.criadas -= 1
+
+
+class Writer:
+    """Writes batches of items to MySQL and Typesense.
+
+    Batches run on the reactor thread pool, one at a time and in submission
+    order, over a connection taken from the pool; that is what keeps
+    get-or-create on termo/variacao race free and per-term ordering intact.
+
+    Storage runs ``shards`` writers, each handed only the terms of its
+    ``numero`` (see ``shard``) and indexing only those.
+    """
+
+    def __init__(
+        self,
+        metrics,
+        index_max_termos,
+        import_batch_size,
+        near_duplicate_threshold,
+        numero=0,
+        shards=1,
+    ):
+        self.metrics = metrics
+        self.numero = numero
+        self.shards = shards
+        self.index = TermoIndex(index_max_termos)
+        self.import_batch_size = import_batch_size
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.pendentes = {}
+        self.rejeicoes = {}
+        self.importar_em = 0.0
+        self.lock = defer.DeferredLock()
+        self.pool = None
+        self.conn = None
+        self.cur = None
+        self.client = None
+        self.embedder = None
+
+    def submit(self, items):
+        return self.lock.run(threads.deferToThread, self.write, items)
+
+    def open(self, pool, client, embedder):
+        self.pool = pool
+        self.client = client
+        self.embedder = embedder
+        self.conn = pool.get()
+        self.cur = self.conn.cursor()
+        self.load_index()
+
+    def write(self, items):
+        self.metrics.inc("items", len(items))
+        self.metrics.inc("batches")
+
+        for tentativa in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                return self._write(items)
+            except Exception as erro:
+                if (
+                    getattr(erro, "errno", None) not in RETRYABLE_ERRNOS
+                    or tentativa == WRITE_ATTEMPTS
+                ):
+                    raise
+
+                logger.warning(
+                    "Retrying a batch of %d items after: %s", len(items), erro
+                )
+
+    def _write(self, items):
+        # load_index and build_documentos leave a read-only transaction open;
+        # its REPEATABLE READ snapshot would hide terms other processes have
+        # committed since.
+        if self.conn.in_transaction:
+            self.conn.rollback()
+
+        try:
+            with self.metrics.time("write"):
+                with self.metrics.time("resolve_termos"):
+                    entradas = self._resolve_termos(items)
+
+                with self.metrics.time("insert_variacoes"):
+                    self._insert_variacoes(items, entradas)
+
+                with self.metrics.time("insert_definicoes"):
+                    self._insert_definicoes(items, entradas)
+
+                # A batch of items the index already holds runs no statement
+                # at all, so there is no transaction to commit.
+                if self.conn.in_transaction:
+                    self._flag_pendentes(entradas)
+
+                    with self.metrics.time("commit"):
+                        self.conn.commit()
+                else:
+                    self.metrics.inc("unchanged_batches")
+        except Exception:
+            self.metrics.inc("failed_batches")
+            self.conn.rollback()
+            self.index.invalidate(normalize(item.termo) for item in items)
+            raise
+
+        for entrada in entradas.values():
+            if entrada.digest != entrada.importado:
+                self.pendentes[entrada.id] = entrada
+
+        if (
+            len(self.pendentes) >= self.import_batch_size
+            and time.monotonic() >= self.importar_em
+        ):
+            self.import_documentos()
+
+    def _flag_pendentes(self, entradas):
+        # Committed with the rows, so a term whose import a crash or a
+        # Typesense failure cut short is imported again on the next run.
+        termo_ids = [
+            entrada.id
+            for entrada in entradas.values()
+            if entrada.digest != entrada.importado
+        ]
+
+        if termo_ids:
+            self.cur.execute(
+                Query.update(termo_tb)
+                .set(termo_tb.pendente, 1)
+                .where(termo_tb.id.isin(termo_ids))
+                .get_sql()
+            )
+
+    def load_index(self):
+        with self.metrics.time("load_index"):
+            self._load_entradas()
+
+    def _load_entradas(self, termos=None):
+        query = Query.from_(termo_tb).select(
+            termo_tb.id, termo_tb.termo, termo_tb.pendente
+        )
+
+        if termos is not None:
+            query = query.where(termo_tb.chave.isin([chave_hash(t) for t in termos]))
+        elif self.shards > 1:
+            query = query.where(shard_criterion(self.numero, self.shards))
+
+        self.cur.execute(query.get_sql())
+
+        entradas = {}
+        por_id = {}
+        pendentes = []
+
+        for termo_id, termo, pendente in self.cur.fetchall():
+            if pendente:
+                pendentes.append(termo_id)
+
+            chave = normalize(termo)
+
+            if chave in entradas:
+                continue
+
+            if termos is None and self.index.cheio:
+                self.index.completo = False
+                continue
+
+            entradas[chave] = por_id[termo_id] = Entrada(termo_id)
+
+        # Committed but not imported yet when a previous run stopped; those
+        # left out of a full index are imported all the same.
+        for termo_id in pendentes:
+            self.pendentes[termo_id] = por_id.get(termo_id) or Entrada(termo_id)
+
+        if not por_id:
+            return entradas
+
+        query = Query.from_(variacao_tb).select(
+            variacao_tb.idTermo, variacao_tb.variacao, variacao_tb.chave
+        )
+
+        if termos is not None:
+            query = query.where(variacao_tb.idTermo.isin(list(por_id)))
+        elif self.shards > 1:
+            query = self._in_shard(query, variacao_tb)
+
+        self.cur.execute(query.get_sql())
+
+        for termo_id, variacao, chave in self.cur:
+            if termo_id in por_id:
+                por_id[termo_id].variacoes.add(normalize(variacao))
+                por_id[termo_id].written(VARIACAO, chave)
+
+        query = Query.from_(definicao_tb).select(
+            definicao_tb.idTermo, definicao_tb.hash
+        )
+
+        if termos is not None:
+            query = query.where(definicao_tb.idTermo.isin(list(por_id)))
+        elif self.shards > 1:
+            query = self._in_shard(query, definicao_tb)
+
+        self.cur.execute(query.get_sql())
+
+        for termo_id, hash in self.cur:
+            if termo_id in por_id:
+                por_id[termo_id].definicoes.add(hash)
+                por_id[termo_id].written(DEFINICAO, hash)
+
+        # Known, so not compared again, but not part of the document.
+        query = Query.from_(definicao_mesclada_tb).select(
+            definicao_mesclada_tb.idTermo, definicao_mesclada_tb.hash
+        )
+
+        if termos is not None:
+            query = query.where(definicao_mesclada_tb.idTermo.isin(list(por_id)))
+        elif self.shards > 1:
+            query = self._in_shard(query, definicao_mesclada_tb)
+
+        self.cur.execute(query.get_sql())
+
+        for termo_id, hash in self.cur:
+            if termo_id in por_id:
+                por_id[termo_id].definicoes.add(hash)
+
+        # Typesense holds what MySQL does, but for the terms still flagged
+        # pendente.
+        for chave, entrada in entradas.items():
+            if entrada.id not in self.pendentes:
+                entrada.importado = entrada.digest
+
+            self.index.add(chave, entrada)
+
+        return entradas
+
+    def _in_shard(self, query, tabela):
+        # Rows of the terms in this writer's shard.
+        return (
+            query.join(termo_tb)
+            .on(termo_tb.id == tabela.idTermo)
+            .where(shard_criterion(self.numero, self.shards))
+        )
+
+    def _resolve_termos(self, items):
+        termos = {}
+
+        for item in items:
+            termos.setdefault(normalize(item.termo), item.termo)
+
+        entradas = {}
+
+        for chave in termos:
+            entrada = self.index.get(chave)
+
+            if entrada is not None:
+                entradas[chave] = entrada
+
+        faltando = [termo for chave, termo in termos.items() if chave not in entradas]
+
+        if faltando and not self.index.completo:
+            self.metrics.inc("index_misses", len(faltando))
+            entradas.update(self._load_entradas(faltando))
+            faltando = [termo for termo in faltando if normalize(termo) not in entradas]
+
+        if faltando:
+            self.metrics.inc("termos_inseridos", len(faltando))
+            # IGNORE: another process may have inserted some of them since.
+            self.cur.execute(
+                Query.into(termo_tb)
+                .columns(termo_tb.termo, termo_tb.slug, termo_tb.chave)
+                .insert(
+                    *((termo, slugify(termo), chave_hash(termo)) for termo in faltando)
+                )
+                .ignore()
+                .get_sql()
+            )
+            # A locking read sees the rows committed by another process after
+            # this transaction's snapshot, which INSERT IGNORE just skipped.
+            self.cur.execute(
+                Query.from_(termo_tb)
+                .select(termo_tb.id, termo_tb.termo)
+                .where(termo_tb.chave.isin([chave_hash(t) for t in faltando]))
+                .get_sql()
+                + " LOCK IN SHARE MODE"
+            )
+
+            for termo_id, termo in self.cur.fetchall():
+                chave = normalize(termo)
+
+                if chave not in entradas:
+                    entradas[chave] = Entrada(termo_id)
+                    self.index.add(chave, entradas[chave])
+
+            # New terms are also stored as a variation of themselves.
+            self._insert_variacoes(
+                [
+                    DefinicaoItem(
+                        termo=termo, variacoes=[Variacao(termo)], definicao="", fonte=""
+                    )
+                    for termo in faltando
+                ],
+                entradas,
+            )
+
+        return entradas
+
+    def _insert_variacoes(self, items, entradas):
+        variacoes = {}
+
+        for item in items:
+            entrada = entradas[normalize(item.termo)]
+
+            for variacao in item.variacoes:
+                chave = normalize(variacao.variacao)
+
+                if chave not in entrada.variacoes:
+                    entrada.variacoes.add(chave)
+                    entrada.written(VARIACAO, chave_hash(variacao.variacao))
+                    variacoes[(entrada.id, chave)] = variacao.variacao
+
+        if variacoes:
+            self.metrics.inc("variacoes_inseridas", len(variacoes))
+            self.cur.execute(
+                Query.into(variacao_tb)
+                .columns(
+                    variacao_tb.idTermo,
+                    variacao_tb.variacao,
+                    variacao_tb.slug,
+                    variacao_tb.chave,
+                )
+                .insert(
+                    *(
+                        (termo_id, variacao, slugify(variacao), chave_hash(variacao))
+                        for (termo_id, _), variacao in variacoes.items()
+                    )
+                )
+                .ignore()
+                .get_sql()
+            )
+
+    def _insert_definicoes(self, items, entradas):
+        definicoes = []
+
+        for item in items:
+            entrada = entradas[normalize(item.termo)]
+            hash = definicao_hash(item.definicao)
+
+            if hash not in entrada.definicoes:
+                entrada.definicoes.add(hash)
+                definicoes.append((entrada.id, item.definicao, item.fonte, hash))
+
+        if definicoes and self.near_duplicate_threshold:
+            with self.metrics.time("near_duplicates"):
+                aceitas = self._drop_near_duplicates(definicoes)
+
+            self.metrics.inc("definicoes_mescladas", len(definicoes) - len(aceitas))
+            self._record_mescladas(definicoes, aceitas)
+            definicoes = aceitas
+
+        por_id = {entrada.id: entrada for entrada in entradas.values()}
+
+        for termo_id, _, _, hash in definicoes:
+            por_id[termo_id].written(DEFINICAO, hash)
+
+        # The unique (idTermo, hash) key absorbs anything the index missed.
+        if definicoes:
+            self.metrics.inc("definicoes_inseridas", len(definicoes))
+            self.cur.execute(
+                Query.into(definicao_tb)
+                .columns(
+                    definicao_tb.idTermo,
+                    definicao_tb.definicao,
+                    definicao_tb.fonte,
+                    definicao_tb.hash,
+                )
+                .insert(*definicoes)
+                .ignore()
+                .get_sql()
+            )
+
+    def _record_mescladas(self, definicoes, aceitas):
+        aceitas = {(termo_id, hash) for termo_id, _, _, hash in aceitas}
+        mescladas = [
+            (termo_id, hash)
+            for termo_id, _, _, hash in definicoes
+            if (termo_id, hash) not in aceitas
+        ]
+
+        if mescladas:
+            self.cur.execute(
+                Query.into(definicao_mesclada_tb)
+                .columns(definicao_mesclada_tb.idTermo, definicao_mesclada_tb.hash)
+                .insert(*mescladas)
+                .ignore()
+                .get_sql()
+            )
+
+    def _drop_near_duplicates(self, definicoes):
+        import numpy as np
+
+        from infolibras.vectors import cosine_similarity, vectorize
+
+        candidatas = {}
+
+        for definicao in definicoes:
+            candidatas.setdefault(definicao[0], []).append(definicao)
+
+        self.cur.execute(
+            Query.from_(definicao_tb)
+            .select(definicao_tb.idTermo, definicao_tb.definicao)
+            .where(definicao_tb.idTermo.isin(list(candidatas)))
+            .get_sql()
+        )
+
+        existentes = {}
+
+        for termo_id, definicao in self.cur.fetchall():
+            existentes.setdefault(termo_id, []).append(definicao)
+
+        aceitas = []
+
+        for termo_id, definicoes_termo in candidatas.items():
+            matriz = vectorize(existentes.get(termo_id, []))
+            vetores = vectorize([definicao for _, definicao, _, _ in definicoes_termo])
+
+            for definicao, vetor in zip(definicoes_termo, vetores):
+                if len(matriz):
+                    similaridade = cosine_similarity(vetor, matriz).max()
+
+                    if similaridade >= self.near_duplicate_threshold:
+                        logger.debug(
+                            "Merged definition of termo %s into an existing one"
+                            " (similarity %.3f)",
+                            termo_id,
+                            similaridade,
+                        )
+                        continue
+
+                matriz = np.vstack([matriz, vetor])
+                aceitas.append(definicao)
+
+        return aceitas
+
+    def import_documentos(self):
+        if not self.pendentes:
+            return
+
+        pendentes, self.pendentes = self.pendentes, {}
+        termo_ids = sorted(pendentes)
+
+        for inicio in range(0, len(termo_ids), self.import_batch_size):
+            lote = termo_ids[inicio : inicio + self.import_batch_size]
+            # Built from what is committed, which is what the digests cover.
+            digests = {termo_id: pendentes[termo_id].digest for termo_id in lote}
+
+            try:
+                with self.metrics.time("build_documentos"):
+                    documentos = search.build_documentos(self.cur, lote)
+
+                if self.embedder is not None:
+                    with self.metrics.time("embeddings"):
+                        search.add_embeddings(self.embedder, documentos)
+
+                with self.metrics.time("typesense_import"):
+                    rejeitados = search.import_documentos(
+                        self.client.collections[search.COLLECTION],
+                        documentos,
+                        "emplace",
+                    )
+
+                self._imported(lote, pendentes, digests, rejeitados)
+            except Exception:
+                # The batches are committed already: the import is retried
+                # later instead of failing them.
+                logger.exception(
+                    "Failed to import %d documents, retrying in %.0fs",
+                    len(termo_ids) - inicio,
+                    IMPORT_RETRY_DELAY,
+                )
+                self.metrics.inc("failed_imports")
+                self.importar_em = time.monotonic() + IMPORT_RETRY_DELAY
+
+                for termo_id in termo_ids[inicio:]:
+                    self.pendentes.setdefault(termo_id, pendentes[termo_id])
+
+                return
+
+            self.metrics.inc("documentos_importados", len(documentos) - len(rejeitados))
+
+    def _imported(self, lote, pendentes, digests, rejeitados):
+        rejeitados = {int(id) for id in rejeitados}
+        importados = []
+
+        for termo_id in lote:
+            if termo_id not in rejeitados:
+                pendentes[termo_id].importado = digests[termo_id]
+                importados.append(termo_id)
+                self.rejeicoes.pop(termo_id, None)
+                continue
+
+            self.rejeicoes[termo_id] = self.rejeicoes.get(termo_id, 0) + 1
+
+            if self.rejeicoes[termo_id] < IMPORT_ATTEMPTS:
+                self.pendentes.setdefault(termo_id, pendentes[termo_id])
+            else:
+                logger.error(
+                    "Giving up on termo %s after %d rejected imports",
+                    termo_id,
+                    IMPORT_ATTEMPTS,
+                )
+
+        if importados:
+            self.cur.execute(
+                Query.update(termo_tb)
+                .set(termo_tb.pendente, 0)
+                .where(termo_tb.id.isin(importados))
+                .get_sql()
+            )
+            self.conn.commit()
+
+    def close(self):
+        self.import_documentos()
+
+        self.cur.close()
+        self.pool.put(self.conn)
+        self.conn = self.cur = None
+
+
+class Storage:
+    """Storage shared by every crawler running in the process.
+
+    Owns the MySQL connection pool, the OpenAI embedder and the writers, so
+    several spiders crawled together feed the same batching writers instead
+    of each opening its own connections. Opened by the first pipeline that
+    starts and closed by the last one that finishes.
+
+    Items are partitioned across the writers by the hash of their normalized
+    termo: unrelated terms are written in parallel, each over its own
+    connection and Typesense client, while a term always goes to the same
+    writer and so keeps its order and race-free get-or-create.
+    """
+
+    _shared = None
+
+    def __init__(
+        self,
+        writers,
+        db_connect=connect,
+        pool_size=4,
+        embedding_cache_dir=None,
+        embedding_model="text-embedding-3-large",
+        embedding_dimensions=3072,
+        embedding_batch_size=256,
+    ):
+        self.writers = writers
+        self.db_connect = db_connect
+        self.pool_size = pool_size
+        self.embedding_cache_dir = embedding_cache_dir
+        self.embedding_model = embedding_model
+        self.embedding_dimensions = embedding_dimensions
+        self.embedding_batch_size = embedding_batch_size
+        self.pool = None
+        self.crawlers = 0
+        # Items submitted and not written yet, and a moving average of the
+        # seconds from submit to commit; read by the backpressure extension.
+        self.backlog = 0
+        self.latencia = 0.0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if cls._shared is None:
+            cls._shared = cls.from_settings(
+                crawler.settings, Metrics.from_crawler(crawler)
+            )
+
+        return cls._shared
+
+    @classmethod
+    def from_settings(cls, settings, metrics):
+        shards = max(settings.getint("INFOLIBRAS_WRITERS", 1), 1)
+
+        return cls(
+            [
+                Writer(
+                    metrics,
+                    index_max_termos=settings.getint(
+                        "INFOLIBRAS_INDEX_MAX_TERMS", 500_000
+                    )
+                    // shards,
+                    import_batch_size=settings.getint(
+                        "INFOLIBRAS_TYPESENSE_BATCH_SIZE", 250
+                    ),
+                    near_duplicate_threshold=settings.getfloat(
+                        "INFOLIBRAS_NEAR_DUPLICATE_THRESHOLD", 0.9
+                    ),
+                    numero=numero,
+                    shards=shards,
+                )
+                for numero in range(shards)
+            ],
+            db_connect=load_object(
+                settings.get("INFOLIBRAS_DB_CONNECT", "infolibras.db.connect")
+            ),
+            pool_size=settings.getint("INFOLIBRAS_DB_POOL_SIZE", 4),
+            embedding_cache_dir=(
+                settings.get("INFOLIBRAS_EMBEDDING_CACHE_DIR")
+                or data_path("embeddings", createdir=True)
+                if settings.getbool("INFOLIBRAS_EMBEDDINGS_ENABLED", True)
+                else None
+            ),
+            embedding_model=settings.get(
+                "INFOLIBRAS_EMBEDDING_MODEL", "text-embedding-3-large"
+            ),
+            embedding_dimensions=settings.getint(
+                "INFOLIBRAS_EMBEDDING_DIMENSIONS", 3072
+            ),
+            embedding_batch_size=settings.getint(
+                "INFOLIBRAS_EMBEDDING_BATCH_SIZE", 256
+            ),
+        )
+
+    def open(self):
+        self.crawlers += 1
+
+        if self.crawlers > 1:
+            # Already opened (or opening): wait for it to finish.
+            return defer.gatherResults(
+                [writer.lock.run(defer.succeed, None) for writer in self.writers]
+            )
+
+        return self._exclusive(self.connect)
+
+    def _exclusive(self, f):
+        """Run ``f`` on the thread pool once every writer is idle, holding
+        all of their locks so no batch starts until it is done."""
+        d = defer.gatherResults([writer.lock.acquire() for writer in self.writers])
+        d.addCallback(lambda _: threads.deferToThread(f))
+
+        def release(resultado):
+            for writer in self.writers:
+                writer.lock.release()
+
+            return resultado
+
+        d.addBoth(release)
+        return d
+
+    def _each_writer(self, f):
+        # Writers open (loading their index partition) and close (importing
+        # their pending documents) in parallel.
+        with ThreadPoolExecutor(len(self.writers)) as executor:
+            list(executor.map(f, self.writers))
+
+    def connect(self):
+        env = utils.env()
+
+        # Every writer holds a connection for as long as it is open.
+        self.pool = ConnectionPool(
+            self.db_connect, env, max(self.pool_size, len(self.writers))
+        )
+        client = search.client(env)
+
+        if not search.collection_exists(client, search.COLLECTION):
+            logger.error(
+                "Typesense collection %s not found, run `scrapy bootstrap` first",
+                search.COLLECTION,
+            )
+
+        embedder = self.embedder(env)
+        self._each_writer(
+            lambda writer: writer.open(self.pool, search.client(env), embedder)
+        )
+
+    def embedder(self, env):
+        if self.embedding_cache_dir is None:
+            return None
+
+        from openai import OpenAI
+
+        from infolibras.embeddings import Embedder, EmbeddingCache
+
+        return Embedder(
+            OpenAI(api_key=env["OPENAI_API_KEY"], base_url=env.get("OPENAI_BASE_URL")),
+            EmbeddingCache(self.embedding_cache_dir, self.embedding_dimensions),
+            self.embedding_model,
+            self.embedding_batch_size,
+        )
+
+    def partition(self, items):
+        """Split ``items`` into ``(writer, items)`` pairs by termo."""
+        if len(self.writers) == 1:
+            return [(self.writers[0], items)]
+
+        lotes = [[] for _ in self.writers]
+
+        for item in items:
+            lotes[shard(chave_hash(item.termo), len(self.writers))].append(item)
+
+        return [(writer, lote) for writer, lote in zip(self.writers, lotes) if lote]
+
+    def submit(self, items):
+        self.backlog += len(items)
+        inicio = time.monotonic()
+
+        d = defer.gatherResults(
+            [writer.submit(lote) for writer, lote in self.partition(items)],
+            consumeErrors=True,
+        )
+        d.addErrback(lambda failure: failure.value.subFailure)
+        d.addBoth(self._written, len(items), inicio)
+        return d
+
+    def write(self, items):
+        """Write ``items`` synchronously, for commands running outside the
+        reactor."""
+        lotes = self.partition(items)
+
+        if len(lotes) == 1:
+            writer, lote = lotes[0]
+            writer.write(lote)
+            return
+
+        with ThreadPoolExecutor(len(lotes)) as executor:
+            list(executor.map(lambda lote: lote[0].write(lote[1]), lotes))
+
+    def _written(self, resultado, quantidade, inicio):
+        self.backlog -= quantidade
+        self.latencia += (time.monotonic() - inicio - self.latencia) * 0.2
+        return resultado
+
+    def close(self):
+        self.crawlers -= 1
+
+        if self.crawlers > 0:
+            return defer.succeed(None)
+
+        # Waits for the batches already submitted to every writer.
+        return self._exclusive(self.disconnect)
+
+    def disconnect(self):
+        self._each_writer(Writer.close)
+        self.pool.close()
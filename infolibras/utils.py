@@ -0,0 +1,21 @@
+import hashlib
+import os
+
+from dotenv import dotenv_values
+
+
+def normalize(texto: str) -> str:
+    return " ".join(texto.split()).casefold()
+
+
+def chave_hash(texto: str) -> str:
+    return hashlib.blake2b(normalize(texto).encode(), digest_size=16).hexdigest()
+
+
+def definicao_hash(definicao: str) -> str:
+    return chave_hash(definicao)
+
+
+def env() -> dict:
+    # Variables set in the environment take precedence over the .env file.
+    return {**dotenv_values(), **os.environ}
@@ -0,0 +1,45 @@
+import re
+import zlib
+
+import numpy as np
+from numpy.linalg import norm
+
+from infolibras.utils import normalize
+
+DIMENSOES = 1024
+
+token_re = re.compile(r"\w+")
+
+
+def vectorize(textos: list[str], dimensoes: int = DIMENSOES) -> np.ndarray:
+    """Hashed, L2-normalized bag of word unigrams and bigrams.
+
+    Returns a contiguous float32 matrix with one row per text, so comparing a
+    definition against many others is a single matrix-vector product.
+    """
+    matriz = np.zeros((len(textos), dimensoes), dtype=np.float32)
+
+    for linha, texto in enumerate(textos):
+        tokens = token_re.findall(normalize(texto))
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        indices = [zlib.crc32(feature.encode()) % dimensoes for feature in features]
+        matriz[linha] = np.bincount(indices, minlength=dimensoes)
+
+    np.log1p(matriz, out=matriz)
+    normas = norm(matriz, axis=1, keepdims=True)
+    np.divide(matriz, normas, out=matriz, where=normas > 0)
+
+    return matriz
+
+
+def cosine_similarity(a, b):
+    """Cosine similarity between the vector ``a`` and ``b``.
+
+    ``b`` may be a single vector or a matrix, in which case ``a`` is compared
+    with each of its rows at once. Empty vectors have similarity 0.
+    """
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.nan_to_num((b @ a) / (norm(b, axis=-1) * norm(a)))